@@ -0,0 +1,509 @@
+# benchmarks.py
+# Offline benchmarks. Run: python benchmarks.py [--json out.json] [name[:key=value,...] ...]
+#   micro:    membership, dates, jobs (the default set)
+#   end to end against a fake Bot and a fake worksheet, no network or credentials:
+#             check, resendall, split, prune   e.g.  python benchmarks.py --json before.json check:subscribers=10000,jobs=500
+#   startup:  fresh-process import time per entry point and the lock-lost exit path
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timedelta
+
+
+def _per_call(fn, calls: int) -> float:
+    """Average seconds per call of fn() over `calls` calls."""
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls
+
+
+def _report(title: str, results: dict):
+    print(f"\n== {title} ==")
+    for name, seconds in results.items():
+        print(f"  {name:<34} {seconds * 1e6:>12.2f} µs/call")
+
+
+# ---------------- membership lookups ----------------
+def bench_membership(n: int = 100_000):
+    """is_premium / is_subscriber at n subscribers: per-call JSON reload vs SQLite vs in-memory index."""
+    from state_store import StateStore
+    from membership import MembershipIndex
+
+    tmp = tempfile.mkdtemp(prefix="bench_membership_")
+    ids = random.sample(range(10**9, 10**10), n)
+    expiry = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%d")
+    premium = {str(c): expiry for c in ids[: n // 10]}
+
+    premium_file = os.path.join(tmp, "premium_users.json")
+    with open(premium_file, "w", encoding="utf-8") as f:
+        json.dump(premium, f)
+    subscribers = [str(c) for c in ids]
+
+    store = StateStore(os.path.join(tmp, "state.db"))
+    with store.transaction():
+        store.conn.executemany("INSERT INTO subscribers (chat_id, added_at) VALUES (?, 0)", ((c,) for c in ids))
+        store.conn.executemany("INSERT INTO premium (chat_id, expiry) VALUES (?, ?)",
+                               ((int(c), e) for c, e in premium.items()))
+
+    probe = ids[n // 2]
+
+    def json_is_premium():
+        with open(premium_file, "r", encoding="utf-8") as f:
+            users = json.load(f)
+        exp = users.get(str(probe))
+        return bool(exp) and datetime.strptime(exp, "%Y-%m-%d").date() >= datetime.utcnow().date()
+
+    def sqlite_is_premium():
+        exp = store.premium_expiry(probe)
+        return bool(exp) and datetime.strptime(exp, "%Y-%m-%d").date() >= datetime.utcnow().date()
+
+    started = time.perf_counter()
+    index = MembershipIndex(store)
+    load_seconds = time.perf_counter() - started
+
+    results = {
+        "is_premium: JSON reload per call": _per_call(json_is_premium, 20),
+        "is_premium: SQLite query": _per_call(sqlite_is_premium, 20_000),
+        "is_premium: in-memory index": _per_call(lambda: index.is_premium(probe), 200_000),
+        "is_subscriber: list `in` (old)": _per_call(lambda: str(probe) in subscribers, 200),
+        "is_subscriber: in-memory index": _per_call(lambda: index.is_subscriber(probe), 200_000),
+    }
+    _report(f"membership lookups at {n:,} subscribers", results)
+    print(f"  index load (once per process)      {load_seconds * 1e3:>12.2f} ms")
+    store.close()
+    return {**results, "index load (once per process)": load_seconds}
+
+
+# ---------------- date parsing ----------------
+def bench_dates(n: int = 5_000):
+    """Per-row Last Date cost over n sheet rows: strptime loop (old) vs compiled regex vs memoized vs carried on the Job."""
+    import dates
+    from jobs import Job
+
+    formats = dates.DATE_FORMATS + [dates.FALLBACK_FORMAT]
+    start = datetime(2025, 1, 1)
+    raws = []
+    for i in range(n):
+        d = start + timedelta(days=i % 400)
+        fmt = ("%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "")[i % 4]
+        raws.append(d.strftime(fmt) if fmt else "Refer official ad")
+    rows = [Job(last_date=r) for r in raws]
+
+    def strptime_loop(s):
+        if not s:
+            return None
+        s = str(s).strip()
+        for fmt in formats:
+            try:
+                return datetime.strptime(s, fmt).date()
+            except Exception:
+                continue
+        return None
+
+    def per_row(fn):
+        return lambda: [fn(x) for x in raws]
+
+    uncached = dates.parse_date.__wrapped__
+    dates.parse_date.cache_clear()
+    results = {
+        "strptime loop (old)": _per_call(per_row(strptime_loop), 5) / n,
+        "compiled regex, no cache": _per_call(per_row(uncached), 5) / n,
+        "compiled regex, memoized": _per_call(per_row(dates.parse_date), 20) / n,
+        "parsed at ingest (job.deadline)": _per_call(lambda: [j.deadline for j in rows], 20) / n,
+    }
+    _report(f"Last Date parsing, per row ({n:,} rows, 1 in 4 unparseable)", results)
+    return results
+
+
+# ---------------- row representation ----------------
+def _synthetic_sheet(n: int):
+    from jobs import HEADERS
+
+    start = datetime.utcnow()
+    sources = ["SSC", "UPSC", "ISRO", "DRDO", "Railways", "Banking", "State PSC", "Defence"]
+    values = [list(HEADERS)]
+    for i in range(n):
+        last = (start + timedelta(days=i % 365)).strftime("%d/%m/%Y")
+        values.append([
+            f"Recruitment of {random.choice(['Junior', 'Senior', 'Assistant'])} Engineer post {i}",
+            last, "18-30 years", "B.Tech / B.E.", "" if i % 3 else "2 years",
+            f"https://example.gov.in/advt/{i}.pdf", sources[i % len(sources)],
+        ])
+    return values
+
+
+def _dict_rows(values):
+    """The old representation: one {header: value} dict per row, via canonicalize_row."""
+    from jobs import HEADERS, build_job_id
+    from dates import parse_date
+
+    def canonicalize_row(row):
+        norm = {(k or "").strip(): (v if v is not None else "") for k, v in row.items()}
+        out = {}
+        for h in HEADERS:
+            found_key = None
+            for k in norm.keys():
+                if k.strip().lower() == h.lower():
+                    found_key = k
+                    break
+            out[h] = str(norm.get(found_key, "")).strip() if found_key else ""
+        return out
+
+    rows = [(i, canonicalize_row(dict(zip(values[0], raw)))) for i, raw in enumerate(values[1:], start=2)]
+    # What one check used to do per row: expiry parse, id build, grouping by source.
+    for _, r in rows:
+        parse_date(r.get("Last Date", ""))
+        build_job_id(r.get("Job Title", ""), r.get("Last Date", ""))
+        r.get("Source", "General")
+    return rows
+
+
+def _job_rows(values):
+    from jobs import column_resolver
+
+    build = column_resolver(values[0])
+    rows = [(i, build(raw)) for i, raw in enumerate(values[1:], start=2)]
+    for _, j in rows:
+        j.deadline, j.job_id, j.source
+    return rows
+
+
+def bench_jobs(n: int = 50_000):
+    """Memory and CPU of n sheet rows as header-keyed dicts (old) vs Job records."""
+    import gc
+    import tracemalloc
+    from dates import parse_date
+
+    values = _synthetic_sheet(n)
+    results = {}
+    print(f"\n== sheet rows: {n:,} synthetic rows ==")
+    for name, build in (("dict rows + canonicalize_row", _dict_rows), ("Job records (__slots__)", _job_rows)):
+        parse_date.cache_clear()
+        gc.collect()
+        started = time.perf_counter()
+        rows = build(values)
+        seconds = time.perf_counter() - started
+
+        parse_date.cache_clear()
+        gc.collect()
+        tracemalloc.start()
+        rows = build(values)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:<30} {seconds * 1e3:>9.1f} ms   {current / 2**20:>8.1f} MiB   "
+              f"{seconds / n * 1e6:.2f} µs/row")
+        results[name] = {"seconds": seconds, "bytes": current}
+        del rows
+    return results
+
+
+# ---------------- offline fakes ----------------
+
+class FakeBot:
+    """Async stand-in for telegram.Bot: fixed latency, random flood waits, increasing message ids.
+    Chats in `blocked` fail every call with Forbidden, like a user who blocked the bot."""
+
+    def __init__(self, latency: float = 0.0, flood_rate: float = 0.0, seed: int = 1, blocked=()):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.rng = random.Random(seed)
+        self.blocked = set(blocked)
+        self.calls = {}
+        self.flood_waits = 0
+        self._next_id = 1
+
+    async def _api(self, method: str, chat_id=None):
+        from telegram.error import Forbidden, RetryAfter
+
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if self.flood_rate and self.rng.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise RetryAfter(0)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._api("sendMessage", chat_id)
+        self._next_id += 1
+        return types.SimpleNamespace(message_id=self._next_id, chat_id=chat_id)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._api("editMessageText", chat_id)
+        return True
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        await self._api("deleteMessage", chat_id)
+        return True
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        await self._api("sendPhoto", chat_id)
+        self._next_id += 1
+        return types.SimpleNamespace(message_id=self._next_id, chat_id=chat_id)
+
+
+class _OfflineBot:
+    """bot.py wired to a fresh temp state store, a FakeWorksheet and an unthrottled limiter."""
+
+    def __init__(self, subscribers: int, jobs: int, premium_share: float = 0.1, sources: int = 8,
+                 latency: float = 0.0, flood_rate: float = 0.0, seed: int = 1):
+        self.tmp = tempfile.mkdtemp(prefix="bench_offline_")
+        os.chdir(self.tmp)   # sheet cache and any relative paths land here
+
+        import bot
+        import delivery
+        import sheet_cache
+        import sheet_utils
+        from chat_health import use_chat_health
+        from testing_fakes import FakeWorksheet
+        from job_index import use_job_index
+        from ledger import use_ledger
+        from membership import use_membership
+        from state_store import StateStore, use_store
+
+        store = StateStore(os.path.join(self.tmp, "state.db"))
+        ids = random.Random(seed).sample(range(10**9, 10**10), subscribers)
+        expiry = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%d")
+        with store.transaction():
+            store.conn.executemany("INSERT INTO subscribers (chat_id, added_at) VALUES (?, ?)",
+                                   ((c, i) for i, c in enumerate(ids)))
+            store.conn.executemany("INSERT INTO premium (chat_id, expiry) VALUES (?, ?)",
+                                   ((c, expiry) for c in ids[: int(subscribers * premium_share)]))
+        store.set_meta("json_migrated", "bench")
+        use_store(store)
+        use_membership(None)
+        use_ledger(None)
+        use_job_index(None)
+        use_chat_health(None)
+
+        self.ws = FakeWorksheet.synthetic(jobs, sources=sources, seed=seed)
+        sheet_utils.SNAPSHOT = sheet_utils.SheetSnapshot(open_worksheet=lambda: self.ws)
+        sheet_cache._MEMO = None
+        delivery.LIMITER = delivery.RateLimiter(global_rate=1e9, per_chat_rate=1e9, per_chat_burst=10**6)
+        bot.RENDER_CACHE = bot.RenderCache()
+        bot._LAST_CHECKED_VERSION = None
+
+        self.bot_module = bot
+        self.bot = FakeBot(latency=latency, flood_rate=flood_rate, seed=seed)
+        self.store = store
+        self.subscribers = ids
+
+
+def _stage_totals() -> dict:
+    from metrics import STAGE_SECONDS
+
+    return {dict(k).get("stage"): (s[-2], s[-1]) for k, s in STAGE_SECONDS.series.items()}
+
+
+def _measure(label: str, fn, fake_bot=None) -> dict:
+    """Run fn() (sync or coroutine function) and collect wall time, API calls, peak memory and stage times."""
+    import tracemalloc
+
+    before_calls = dict(fake_bot.calls) if fake_bot else {}
+    before_floods = fake_bot.flood_waits if fake_bot else 0
+    before_stages = _stage_totals()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    if asyncio.iscoroutine(result):
+        result = asyncio.run(result)
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stages = {}
+    for name, (total, count) in _stage_totals().items():
+        prev_total, prev_count = before_stages.get(name, (0.0, 0))
+        if count > prev_count:
+            stages[name] = {"seconds": round(total - prev_total, 6), "calls": count - prev_count}
+    out = {"wall_seconds": round(wall, 4), "peak_bytes": peak, "stages": stages}
+    if fake_bot is not None:
+        out["api_calls"] = {m: n - before_calls.get(m, 0) for m, n in fake_bot.calls.items()
+                            if n - before_calls.get(m, 0)}
+        out["flood_waits"] = fake_bot.flood_waits - before_floods
+    calls = sum(out.get("api_calls", {}).values())
+    print(f"  {label:<28} {wall:>8.2f} s  {peak / 2**20:>8.1f} MiB peak  {calls:>8,} API calls")
+    return out
+
+
+# ---------------- offline scenarios ----------------
+def bench_check(subscribers: int = 10_000, jobs: int = 500, latency: float = 0.0, flood_rate: float = 0.001):
+    """check_jobs end to end against fakes: cold fan-out, unchanged sheet, then 5 new jobs."""
+    env = _OfflineBot(subscribers, jobs, latency=latency, flood_rate=flood_rate)
+    bot = env.bot_module
+    print(f"\n== check_jobs: {subscribers:,} subscribers x {jobs:,} jobs (offline) ==")
+    results = {"params": {"subscribers": subscribers, "jobs": jobs, "latency": latency, "flood_rate": flood_rate}}
+    results["cold"] = _measure("cold (everyone, everything)", lambda: bot.check_jobs(env.bot), env.bot)
+    results["unchanged"] = _measure("sheet unchanged", lambda: bot.check_jobs(env.bot), env.bot)
+    env.ws.add_jobs(5)
+    results["delta"] = _measure("5 new jobs", lambda: bot.check_jobs(env.bot), env.bot)
+    results["sheet_calls"] = dict(env.ws.calls)
+    return results
+
+
+def bench_prune(subscribers: int = 10_000, jobs: int = 200, blocked_share: float = 0.2):
+    """check_jobs with a share of subscribers who blocked the bot: the run that finds them, then the next."""
+    env = _OfflineBot(subscribers, jobs)
+    bot = env.bot_module
+    from chat_health import get_chat_health
+
+    env.bot.blocked = set(env.subscribers[: int(subscribers * blocked_share)])
+    print(f"\n== pruning: {subscribers:,} subscribers, {len(env.bot.blocked):,} blocked the bot ==")
+    results = {"params": {"subscribers": subscribers, "jobs": jobs, "blocked_share": blocked_share}}
+    results["first"] = _measure("first check (finds them)", lambda: bot.check_jobs(env.bot), env.bot)
+    env.ws.add_jobs(5)
+    results["next"] = _measure("5 new jobs, after pruning", lambda: bot.check_jobs(env.bot), env.bot)
+    results["chat_health"] = get_chat_health().health()
+    print(f"  pruned {results['chat_health']['pruned_total']:,} chat(s)")
+    return results
+
+
+def bench_resendall(jobs: int = 500, repeats: int = 20, latency: float = 0.0):
+    """/resendall for one premium and one free chat, repeated (render cache warm after the first)."""
+    env = _OfflineBot(subscribers=100, jobs=jobs, premium_share=0.5, latency=latency)
+    bot = env.bot_module
+    premium_chat, free_chat = env.subscribers[0], env.subscribers[-1]
+
+    def update(chat_id):
+        async def reply_text(text, **kwargs):
+            return None
+        return types.SimpleNamespace(effective_chat=types.SimpleNamespace(id=chat_id),
+                                     message=types.SimpleNamespace(reply_text=reply_text))
+
+    context = types.SimpleNamespace(bot=env.bot)
+
+    async def resend(chat_id):
+        for _ in range(repeats):
+            await bot.cmd_resendall(update(chat_id), context)
+
+    print(f"\n== /resendall: {jobs:,} jobs, {repeats} times per chat (offline) ==")
+    return {
+        "params": {"jobs": jobs, "repeats": repeats, "latency": latency},
+        "premium": _measure("premium chat", lambda: resend(premium_chat), env.bot),
+        "free": _measure("free chat", lambda: resend(free_chat), env.bot),
+    }
+
+
+def bench_split(jobs: int = 500, repeats: int = 50):
+    """split_messages for one source with `jobs` rows."""
+    env = _OfflineBot(subscribers=1, jobs=jobs, sources=1)
+    bot = env.bot_module
+    import sheet_utils
+
+    rows = [job for _, job in sheet_utils.read_sheet_rows()]
+    print(f"\n== split_messages: {jobs:,} jobs in one source ==")
+
+    def split_all():
+        for _ in range(repeats):
+            bot.split_messages("Source 0", rows)
+
+    out = _measure(f"{repeats} splits", split_all)
+    out["per_call_seconds"] = out["wall_seconds"] / repeats
+    out["chunks"] = len(bot.split_messages("Source 0", rows))
+    return out
+
+
+# ---------------- startup ----------------
+def _spawn_seconds(args, repeats: int, env=None) -> float:
+    """Median wall time of a fresh interpreter running `args`."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=here, capture_output=True, env=env)
+        times.append(time.perf_counter() - started)
+    return sorted(times)[len(times) // 2]
+
+
+def bench_startup(repeats: int = 5):
+    """Fresh-process import time of each entry point, and how fast a container that loses the lock exits."""
+    import fcntl
+    import shutil
+    import tempfile
+
+    baseline = _spawn_seconds(["-c", "pass"], repeats)
+    print(f"\n== startup (median of {repeats}, minus {baseline * 1e3:.0f} ms bare interpreter) ==")
+    results = {"interpreter_seconds": baseline}
+    for module in ("bot", "sheet_async", "scrapers", "sheet_utils"):
+        seconds = _spawn_seconds(["-c", f"import {module}"], repeats) - baseline
+        print(f"  import {module:<12} {seconds * 1e3:8.0f} ms")
+        results[f"import_{module}"] = seconds
+
+    # A second container: the lock is held here, so bot.py should exit before importing much.
+    # Use a private lock file so a bot running on this machine is neither blocked nor mistaken for us.
+    lock_dir = tempfile.mkdtemp(prefix="jobbot-bench-")
+    lock_path = os.path.join(lock_dir, "bot_polling.lock")
+    try:
+        with open(lock_path, "w") as held:
+            fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            seconds = _spawn_seconds(["bot.py"], repeats, env=dict(os.environ, BOT_LOCKFILE=lock_path)) - baseline
+    finally:
+        shutil.rmtree(lock_dir, ignore_errors=True)
+    print(f"  bot.py, lock held    {seconds * 1e3:8.0f} ms")
+    results["lock_held_exit"] = seconds
+    return results
+
+
+BENCHMARKS = {
+    "membership": bench_membership,
+    "dates": bench_dates,
+    "jobs": bench_jobs,
+    "check": bench_check,
+    "resendall": bench_resendall,
+    "split": bench_split,
+    "prune": bench_prune,
+    "startup": bench_startup,
+}
+
+# Not run by default (they rebuild bot state); name them explicitly.
+OFFLINE = {"check", "resendall", "split", "prune", "startup"}
+
+
+def _parse_spec(spec: str):
+    """"check:subscribers=2000,jobs=200" -> ("check", {"subscribers": 2000, "jobs": 200})"""
+    name, _, params = spec.partition(":")
+    kwargs = {}
+    for item in filter(None, params.split(",")):
+        key, _, value = item.partition("=")
+        kwargs[key] = float(value) if "." in value else int(value)
+    return name, kwargs
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv):
+    """python benchmarks.py [--json out.json] [name[:key=value,...] ...]"""
+    json_path = None
+    if "--json" in argv:
+        i = argv.index("--json")
+        json_path = os.path.abspath(argv[i + 1])
+        argv = argv[:i] + argv[i + 2:]
+    specs = [_parse_spec(a) for a in argv] or [(n, {}) for n in BENCHMARKS if n not in OFFLINE]
+    report = {"commit": _git_commit(), "python": sys.version.split()[0],
+              "started": datetime.utcnow().isoformat(timespec="seconds") + "Z", "results": {}}
+    for name, kwargs in specs:
+        if name not in BENCHMARKS:
+            sys.exit(f"Unknown benchmark {name!r}; choose from {', '.join(BENCHMARKS)}")
+        report["results"][name] = BENCHMARKS[name](**kwargs)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nWrote {json_path}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,13 +1,40 @@
 import os
 import sys
+import fcntl
+
+# Read from the environment, not config: the lock is taken before config is imported.
+LOCKFILE_PATH = os.environ.get("BOT_LOCKFILE", "/tmp/bot_polling.lock")
+
+def acquire_lock_or_exit():
+    """Try to acquire a lockfile. If another process already holds it, exit."""
+    lock_file = open(LOCKFILE_PATH, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        print("✅ Lock acquired, this process will run polling.")
+        return lock_file
+    except BlockingIOError:
+        print("⚠️ Another instance is already running polling. Shutting down this container to save resources.")
+        sys.exit(0)  # exit immediately, Render will recycle this container
+
+# --- Lock first: a container that loses it exits before the heavy imports below ---
+_LOCK_FILE = None
+if __name__ == "__main__" and not {"--once", "--scrape"} & set(sys.argv):
+    _LOCK_FILE = acquire_lock_or_exit()
+
 import json
+import time
 import asyncio
+import hashlib
+import hmac
 import logging
+import zlib
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 from collections import defaultdict
+from functools import lru_cache
 
 from telegram import Update, Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -17,32 +44,27 @@ from telegram.ext import (
     filters,
 )
 
-import qrcode
-from io import BytesIO
-
-from sheet_utils import read_sheet_rows, remove_expired_rows
+import sheet_async
+from dates import format_date
+from jobs import Job
+from delivery import DeliveryRun
+from scheduler import Scheduler
+import metrics
+from metrics import stage, traced
+from state_store import get_store
+from membership import get_membership
+from ledger import get_ledger, job_hash
+from broadcasts import get_broadcasts, progress_text
+from chat_health import get_chat_health
+from media import asset_key, get_media_cache
 import config
 
 from http.server import BaseHTTPRequestHandler, HTTPServer
 import threading
 
-import fcntl
-
-LOCKFILE_PATH = "/tmp/bot_polling.lock"
-
-def acquire_lock_or_exit():
-    """Try to acquire a lockfile. If another process already holds it, exit."""
-    lock_file = open(LOCKFILE_PATH, "w")
-    try:
-        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        print("✅ Lock acquired, this process will run polling.")
-        return lock_file
-    except BlockingIOError:
-        print("⚠️ Another instance is already running polling. Shutting down this container to save resources.")
-        sys.exit(0)  # exit immediately, Render will recycle this container
-
 # ---------------- global flags ----------------
 BOT_RUNNING = False
+CHECK_SCHEDULER = None  # set in main(); read by the /health route
 
 # ---------------- logging ----------------
 logging.basicConfig(level=logging.INFO)
@@ -50,72 +72,33 @@ logger = logging.getLogger(__name__)
 
 # --------------- config shortcuts ----------------
 BOT_TOKEN = config.BOT_TOKEN
-DATE_FORMATS = config.DATE_FORMATS
-OUTPUT_DATE_FORMAT = getattr(config, "OUTPUT_DATE_FORMAT", "%d/%m/%Y")
 RESEND_ALL_ON_NEW = config.RESEND_ALL_ON_NEW
-SENT_JOBS_FILE = config.SENT_JOBS_FILE
-SUBSCRIBERS_FILE = config.SUBSCRIBERS_FILE
 DEFAULT_SUBSTITUTION = getattr(config, "DEFAULT_SUBSTITUTION", "Refer official ad")
 
-MESSAGE_IDS_FILE = "message_ids.json"
-PREMIUM_FILE = "premium_users.json"
-
 ADMIN_ID = config.ADMIN_ID
 CHECK_INTERVAL_MINUTES = int(os.getenv("JOB_INTERVAL_MINUTES", "60"))
+# The scheduler moves the interval between these as the sheet changes more or less often.
+# The max defaults to the base interval: a quiet sheet is never checked less often than before.
+CHECK_MIN_INTERVAL_MINUTES = min(CHECK_INTERVAL_MINUTES, int(getattr(config, "CHECK_MIN_INTERVAL_MINUTES", CHECK_INTERVAL_MINUTES // 2 or 1)))
+CHECK_MAX_INTERVAL_MINUTES = max(CHECK_INTERVAL_MINUTES, int(getattr(config, "CHECK_MAX_INTERVAL_MINUTES", CHECK_INTERVAL_MINUTES)))
 
 # Telegram max limit
 MAX_LEN = 4000
+# Content-defined chunking for long digests: a job block ends a chunk with probability
+# len(block) / CHUNK_TARGET_LEN (by its hash), so chunks average about CHUNK_TARGET_LEN.
+CHUNK_TARGET_LEN = MAX_LEN // 2
 
 # ---------------- UPI config ----------------
 UPI_ID = config.UPI_ID   # e.g. "vinod@okaxis"
 
-# ---------------- JSON helpers ----------------
-def load_json_file(path: str, default):
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return default
-    return default
-
-def save_json_file(path: str, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-
-def load_premium_users() -> dict:
-    return load_json_file(PREMIUM_FILE, {})
-
-def save_premium_users(users: dict):
-    save_json_file(PREMIUM_FILE, users)
-
-# ---------------- utility ----------------
-def parse_indian_date(s: str):
-    if not s:
-        return None
-    s = str(s).strip()
-    for fmt in DATE_FORMATS:
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            continue
-    try:
-        return datetime.strptime(s, "%d %b %Y").date()
-    except Exception:
-        return None
-
-def build_job_id(title: str, last_date: str) -> str:
-    return f"{title.strip().lower()}|{last_date.strip()}"
-
 # ---------------- formatting ----------------
-def format_job_text(row: Dict[str, str]) -> str:
-    ld = parse_indian_date(row.get("Last Date", ""))
-    date_text = ld.strftime(OUTPUT_DATE_FORMAT) if ld else row.get("Last Date", "")
-    title = row.get("Job Title", "Untitled Job")
-    age = row.get("Age Limit", "") or DEFAULT_SUBSTITUTION
-    qual = row.get("Qualification", "") or DEFAULT_SUBSTITUTION
-    exp = row.get("Experience", "") or DEFAULT_SUBSTITUTION
-    apply_link = row.get("Apply Link", "").strip()
+def format_job_text(job: Job) -> str:
+    date_text = format_date(job.deadline, job.last_date)
+    title = job.title
+    age = job.age or DEFAULT_SUBSTITUTION
+    qual = job.qualification or DEFAULT_SUBSTITUTION
+    exp = job.experience or DEFAULT_SUBSTITUTION
+    apply_link = job.link
 
     message = (
         f"🔔 <b>{title}</b>\n"
@@ -129,6 +112,7 @@ def format_job_text(row: Dict[str, str]) -> str:
     return message
 
 # ---------------- footer keyboard ----------------
+@lru_cache(maxsize=1)
 def build_footer_keyboard():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("🔗 Share this bot", url="https://t.me/share/url?url=https://t.me/IndiaJobBot65_bot&text=Check%20out%20this%20Job%20Alert%20Bot!")],
@@ -144,124 +128,280 @@ def premium_teaser_text() -> str:
         "👉 Use /subscribe to unlock Premium!"
     )
     
-def split_messages(source: str, rows: List[Dict[str, str]]) -> List[str]:
+def _is_chunk_boundary(block: str) -> bool:
+    return zlib.crc32(block.encode("utf-8")) % CHUNK_TARGET_LEN < len(block) + 2
+
+def split_messages(source: str, rows: List[Job]) -> List[str]:
+    """Split a source digest into messages of at most MAX_LEN.
+
+    A digest that fits stays one message. Longer ones are cut after every job
+    block whose hash hits (_is_chunk_boundary): where a cut falls depends on that
+    block alone, not on where the chunk started. A segment between two cuts that
+    is still over MAX_LEN is split by length, inside that segment only. A job
+    added or removed therefore only changes the segment it lands in; the chunks
+    before and after keep their text and are not re-edited.
+    """
     job_blocks = [format_job_text(r) for r in rows]
+    header = f"📌 <b>{source}</b>\n\n"
+    if len(header) + sum(len(j) + 2 for j in job_blocks) <= MAX_LEN:
+        return [(header + "".join(j + "\n\n" for j in job_blocks)).strip()]
+
     messages = []
-    current_chunk = f"📌 <b>{source}</b>\n\n"
+    current_chunk = header
     for job in job_blocks:
-        if len(current_chunk) + len(job) + 2 > MAX_LEN:
+        if current_chunk.strip() and len(current_chunk) + len(job) + 2 > MAX_LEN:
+            messages.append(current_chunk.strip())   # forced: the next hash cut resyncs
+            current_chunk = ""
+        current_chunk += job + "\n\n"
+        if _is_chunk_boundary(job):
             messages.append(current_chunk.strip())
-            current_chunk = job + "\n\n"
-        else:
-            current_chunk += job + "\n\n"
+            current_chunk = ""
     if current_chunk.strip():
         messages.append(current_chunk.strip())
     return messages
 
+# ---------------- render cache ----------------
+class RenderedDigest:
+    """HTML chunks + keyboard for one (source, rows, plan tier), shared by every recipient."""
+    __slots__ = ("source", "messages", "keyboard", "hashes")
+
+    def __init__(self, source: str, messages: List[str], keyboard):
+        self.source = source
+        self.messages = messages
+        self.keyboard = keyboard
+        # What the chat will show for each chunk: text and markup together.
+        markup = keyboard.to_json() if keyboard is not None else ""
+        self.hashes = [hashlib.sha1((m + "\x1e" + markup).encode("utf-8")).hexdigest() for m in messages]
+
+def rows_content_hash(rows: List[Job]) -> str:
+    h = hashlib.sha1()
+    for job in rows:
+        h.update(job.content_hash)
+    return h.hexdigest()
+
+class RenderCache:
+    """Render-once cache keyed by (source, content hash of rows, plan tier).
+
+    Lives for the whole process, so when the sheet has not changed the next
+    run reuses the same digests. Entries not touched during a run are dropped
+    by `end_run()`, which keeps the cache bounded by the live sheet.
+    """
+
+    def __init__(self):
+        self._entries: Dict[tuple, RenderedDigest] = {}
+        self._used = set()
+
+    def get(self, source: str, rows: List[Job], is_premium: bool) -> RenderedDigest:
+        if not is_premium:
+            rows = rows[:2]
+        key = (source, rows_content_hash(rows), "premium" if is_premium else "free")
+        self._used.add(key)
+        digest = self._entries.get(key)
+        if digest is None:
+            digest = RenderedDigest(source, split_messages(source, rows), build_footer_keyboard())
+            self._entries[key] = digest
+        return digest
+
+    def end_run(self):
+        for key in [k for k in self._entries if k not in self._used]:
+            del self._entries[key]
+        self._used = set()
+
+RENDER_CACHE = RenderCache()
+
+def render_sources(grouped: Dict[str, List[Job]]) -> Dict[str, Dict[bool, RenderedDigest]]:
+    """Render both plan tiers of every source once for the whole run."""
+    return {
+        source: {tier: RENDER_CACHE.get(source, rows, tier) for tier in (False, True)}
+        for source, rows in grouped.items()
+    }
+
 # ---------------- sending ----------------
-async def send_or_edit_group_message(bot: Bot, chat_id: int, source: str, rows: List[Dict[str,str]], message_ids: dict, is_premium: bool):
-    chat_key = str(chat_id)
-    if chat_key not in message_ids:
-        message_ids[chat_key] = {}
+async def _edit_chunk(run: DeliveryRun, bot: Bot, chat_id: int, mid: int, text: str, keyboard) -> bool:
+    try:
+        await run.call(bot.edit_message_text, chat_id=chat_id, message_id=mid, text=text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=keyboard)
+        return True
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return True
+        logger.warning("Edit failed for chat=%s message=%s: %s", chat_id, mid, e)
+    except Exception as e:
+        logger.warning("Edit failed for chat=%s message=%s: %s", chat_id, mid, e)
+    return False
 
-    if not is_premium:
-        rows = rows[:2]
+async def send_or_edit_group_message(run: DeliveryRun, bot: Bot, chat_id: int, digest: RenderedDigest, message_ids: dict,
+                                     resend: bool = False, chunk_writes: Optional[dict] = None) -> bool:
+    """Bring one source digest up to date in a chat. Returns False if any chunk failed to go out.
 
-    messages = split_messages(source, rows)
+    The source is tracked as an ordered list of (message_id, content_hash). A chunk
+    whose hash is unchanged is left alone. A changed chunk is edited in place, or
+    sent fresh if the edit fails. Extra chunks are appended, and chunks the digest
+    no longer has are deleted.
 
-    if len(messages) > 1:
-        for msg in messages:
-            try:
-                await bot.send_message(chat_id=chat_id, text=msg, parse_mode="HTML", disable_web_page_preview=True, reply_markup=build_footer_keyboard())
-            except Exception as e:
-                logger.warning("Send failed to %s: %s", chat_id, e)
-        return
+    With `resend` (/resendall) every chunk is sent as a new message and the old
+    ones are deleted, so the digest shows up again even when nothing changed.
 
-    text = messages[0]
-    if source in message_ids[chat_key]:
-        mid = message_ids[chat_key][source]
+    Changed chunk lists are saved right away, or collected in `chunk_writes`
+    ({(chat_id, source): chunks}) for the caller to save in one commit.
+    """
+    chat_key = str(chat_id)
+    per_chat = message_ids.setdefault(chat_key, {})
+    source = digest.source
+    keyboard = digest.keyboard
+    old = per_chat.get(source, [])
+
+    ok = True
+    tracked = []
+    for pos, (text, content_hash) in enumerate(zip(digest.messages, digest.hashes)):
+        if pos < len(old) and not resend:
+            mid, last_hash = old[pos]
+            if last_hash == content_hash:
+                # Telegram would reject this as "message is not modified"; don't spend the call.
+                run.stats.avoided += 1
+                tracked.append((mid, content_hash))
+                continue
+            if await _edit_chunk(run, bot, chat_id, mid, text, keyboard):
+                tracked.append((mid, content_hash))
+                continue
         try:
-            await bot.edit_message_text(chat_id=chat_id, message_id=mid, text=text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=build_footer_keyboard())
-            return
+            msg = await run.call(bot.send_message, chat_id=chat_id, text=text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=keyboard)
+            tracked.append((msg.message_id, content_hash))
         except Exception as e:
-            logger.warning("Edit failed for chat=%s source=%s: %s", chat_id, source, e)
+            logger.warning("Send failed to %s: %s", chat_id, e)
+            ok = False
+            if pos < len(old):
+                tracked.append((old[pos][0], None))  # keep tracking it; retried next run
+
+    replaced = old if resend else old[len(digest.messages):]
+    kept = {mid for mid, _ in tracked}
+    for mid, _ in replaced:
+        if mid in kept:
+            continue   # a resend that failed keeps the old chunk
+        try:
+            await run.call(bot.delete_message, chat_id=chat_id, message_id=mid)
+        except Exception as e:
+            logger.warning("Could not delete surplus chunk %s in chat %s: %s", mid, chat_id, e)
 
-    try:
-        msg = await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML", disable_web_page_preview=True, reply_markup=build_footer_keyboard())
-        message_ids[chat_key][source] = msg.message_id
-        save_json_file(MESSAGE_IDS_FILE, message_ids)
-    except Exception as e:
-        logger.warning("Send failed to %s: %s", chat_id, e)
+    if tracked != old:
+        per_chat[source] = tracked
+        if chunk_writes is not None:
+            chunk_writes[(chat_id, source)] = tracked
+        else:
+            get_store().set_message_chunks(chat_id, source, tracked)
+    return ok
+
+async def deliver_to_chat(run: DeliveryRun, bot: Bot, chat_id: int, digests: List[RenderedDigest], message_ids: dict, teaser: bool,
+                          resend: bool = False, chunk_writes: Optional[dict] = None) -> bool:
+    """One delivery job: every source digest for a chat, in order, then the optional teaser.
+    Returns True if every digest went out (the teaser does not count)."""
+    ok = True
+    for digest in digests:
+        ok = await send_or_edit_group_message(run, bot, chat_id, digest, message_ids,
+                                              resend=resend, chunk_writes=chunk_writes) and ok
+        if run.health.is_dead(chat_id):
+            return False   # blocked / deleted: the rest would fail the same way
+    if teaser:
+        try:
+            await run.call(bot.send_message, chat_id=chat_id, text=premium_teaser_text(), parse_mode="HTML")
+        except Exception:
+            pass
+    return ok
 
 # ---------------- job checker ----------------
-async def check_jobs(bot: Bot):
-    logger.info("Running job check...")
+_LAST_CHECKED_VERSION = None  # sheet snapshot version the last completed check ran against
 
-    sent_jobs = load_json_file(SENT_JOBS_FILE, [])
-    sent_set = set(sent_jobs)
+@traced("check_jobs")
+async def check_jobs(bot: Bot, prefer_cache: bool = False) -> bool:
+    """One check: purge, diff against the ledger, deliver. Returns True if jobs were added or expired."""
+    global _LAST_CHECKED_VERSION
+    logger.info("Running job check...")
+    store = get_store()
+    ledger = get_ledger()
+    members = get_membership()
+    health = get_chat_health()
 
-    raw_rows = read_sheet_rows()
-    rows = remove_expired_rows(raw_rows)
+    with stage("active_rows"):
+        rows = await sheet_async.active_rows(prefer_cache=prefer_cache)
     active_rows = [r for _, r in rows]
 
+    # Sheet unchanged and every subscriber up to date: nothing can be new, skip the diff.
+    version = sheet_async.snapshot_version()
+    if version == _LAST_CHECKED_VERSION and ledger.all_synced(members.subscribers):
+        logger.info("Sheet unchanged since last check, nothing to do.")
+        return False
+
+    with stage("ledger_gc"):
+        hashes = [job_hash(j.job_id) for j in active_rows]
+        active = set(hashes)
+        expired = ledger.collect_garbage(active)
+    if expired:
+        logger.info("Ledger: forgot %d expired job ids.", expired)
+
     if not active_rows:
-        save_json_file(SENT_JOBS_FILE, [])
-        save_json_file(MESSAGE_IDS_FILE, {})
+        store.clear_message_ids()
+        _LAST_CHECKED_VERSION = version
         logger.info("No active jobs left.")
-        return
+        return bool(expired)
 
-    job_ids = [build_job_id(r.get("Job Title",""), r.get("Last Date","")) for r in active_rows]
-    sent_jobs = [jid for jid in sent_jobs if jid in job_ids]
-    sent_set = set(sent_jobs)
-
-    subscribers = load_json_file(SUBSCRIBERS_FILE, [])
+    subscribers = members.subscriber_ids()
     if not subscribers:
-        return
-
-    grouped = defaultdict(list)
-    for jid, r in zip(job_ids, active_rows):
-        grouped[r.get("Source", "General")].append((jid, r))
-
-    message_ids = load_json_file(MESSAGE_IDS_FILE, {})
-
-    for chat in subscribers:
-        chat_id = int(chat)
-        is_premium = is_premium_user(chat_id)
-
-        sent_anything_new = False  # 👈 track if user got something fresh
-
-        for source, jid_rows in grouped.items():
-            rows_to_send = [r for _, r in jid_rows]
-            jids_in_source = [jid for jid, _ in jid_rows]
-
-            new_in_source = [jid for jid in jids_in_source if jid not in sent_set]
-            if new_in_source:
-                await send_or_edit_group_message(bot, chat_id, source, rows_to_send, message_ids, is_premium)
-                for jid in new_in_source:
-                    sent_jobs.append(jid)
-                    sent_set.add(jid)
-                sent_anything_new = True
-
+        _LAST_CHECKED_VERSION = version
+        return bool(expired)
+
+    with stage("grouping"):
+        grouped = defaultdict(list)
+        source_of = {}
+        for h, job in zip(hashes, active_rows):
+            grouped[job.source].append(job)
+            source_of[h] = job.source
+
+        delta = ledger.delta(active)
+        delta_sources = {source_of[h] for h in delta}
+
+    message_ids = store.message_ids()
+    chunk_writes: Dict[tuple, list] = {}   # (chat_id, source) -> chunks; saved with the ledger
+    with stage("render"):
+        digests = render_sources(grouped)
+    outcomes: Dict[int, bool] = {}
+
+    async def deliver(chat_id: int, to_send: List[RenderedDigest], is_premium: bool):
         # 👇 Only show teaser if user is free AND actually received new jobs
-        if (not is_premium) and sent_anything_new:
-            try:
-                await bot.send_message(chat_id=chat_id, text=premium_teaser_text(), parse_mode="HTML")
-            except Exception:
-                pass
-
-    save_json_file(SENT_JOBS_FILE, sent_jobs)
-    save_json_file(MESSAGE_IDS_FILE, message_ids)
+        outcomes[chat_id] = await deliver_to_chat(run, bot, chat_id, to_send, message_ids, teaser=not is_premium,
+                                                  chunk_writes=chunk_writes)
+
+    # Decide who gets what up front (cheap, in order), then fan the sends out concurrently.
+    with stage("send"):
+        async with DeliveryRun("check_jobs") as run:
+            for chat_id in subscribers:
+                pending = ledger.pending(chat_id, active, delta)
+                if not pending:
+                    outcomes[chat_id] = True
+                    continue
+                if health.should_skip(chat_id):
+                    continue   # backing off: stays behind in the ledger and catches up later
+                sources = delta_sources if chat_id in ledger.synced else {source_of[h] for h in pending}
+                is_premium = is_premium_user(chat_id)
+                to_send = [digests[source][is_premium] for source in grouped if source in sources]
+                run.submit(chat_id, lambda c=chat_id, s=to_send, p=is_premium: deliver(c, s, p))
+
+    RENDER_CACHE.end_run()
+    delivered = [c for c, ok in outcomes.items() if ok]
+    failed = [c for c in subscribers if not outcomes.get(c)]
+    # The message ids sent or edited this run and the ledger update land in one commit.
+    with stage("ledger_commit"), store.transaction():
+        store.set_message_chunks_many(chunk_writes)
+        ledger.commit_run(active, delivered, failed)
+    # Chats that turned out blocked / deleted leave subscribers, message ids and the ledger together.
+    pruned = health.flush()
+    logger.info("Delivered %d new job(s) to %d chat(s); %d chat(s) behind, %d pruned.",
+                len(delta), len(delivered), len(failed) - pruned, pruned)
+    _LAST_CHECKED_VERSION = version
+    return bool(delta or expired)
 
 # ---------------- commands ----------------
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
-    subs = load_json_file(SUBSCRIBERS_FILE, [])
-
-    is_new = False
-    if chat_id not in subs:
-        subs.append(chat_id)
-        save_json_file(SUBSCRIBERS_FILE, subs)
-        is_new = True
+    is_new = get_membership().add_subscriber(chat_id)
 
     is_premium = is_premium_user(int(chat_id))
 
@@ -284,10 +424,8 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
-    subs = load_json_file(SUBSCRIBERS_FILE, [])
-    if chat_id in subs:
-        subs.remove(chat_id)
-        save_json_file(SUBSCRIBERS_FILE, subs)
+    if get_membership().remove_subscriber(chat_id):
+        get_ledger().forget(chat_id)
         await update.message.reply_text("❌ Unsubscribed.")
     else:
         await update.message.reply_text("ℹ️ Not subscribed.")
@@ -301,46 +439,47 @@ async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 async def cmd_resendall(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    rows = read_sheet_rows()
-    rows = remove_expired_rows(rows)
+    rows = await sheet_async.active_rows(prefer_cache=True)
     active_rows = [r for _, r in rows]
     if not active_rows:
         await update.message.reply_text("No active jobs.")
-        save_json_file(SENT_JOBS_FILE, [])
-        save_json_file(MESSAGE_IDS_FILE, {})
+        get_ledger().collect_garbage(set())
+        get_store().clear_message_ids()
         return
 
     grouped = defaultdict(list)
-    for r in active_rows:
-        grouped[r.get("Source","General")].append(r)
+    for job in active_rows:
+        grouped[job.source].append(job)
 
-    message_ids = load_json_file(MESSAGE_IDS_FILE, {})
-    job_ids = [build_job_id(r.get("Job Title",""), r.get("Last Date","")) for r in active_rows]
-    save_json_file(SENT_JOBS_FILE, job_ids)
+    message_ids = get_store().message_ids()
+    active = {job_hash(j.job_id) for j in active_rows}
 
     chat_id = update.effective_chat.id
     is_premium = is_premium_user(chat_id)
-    for source, rs in grouped.items():
-        await send_or_edit_group_message(context.bot, chat_id, source, rs, message_ids, is_premium)
 
-    save_json_file(MESSAGE_IDS_FILE, message_ids)
+    async def deliver():
+        if await deliver_to_chat(run, context.bot, chat_id, digests, message_ids, teaser=not is_premium, resend=True):
+            get_ledger().mark_delivered(chat_id, active)
+        else:
+            await update.message.reply_text("⚠️ Some job lists could not be sent; try /resendall again later.")
 
-    if not is_premium:
-        await context.bot.send_message(chat_id=chat_id, text=premium_teaser_text(), parse_mode="HTML")
+    async with DeliveryRun("resendall") as run:
+        digests = [RENDER_CACHE.get(source, rs, is_premium) for source, rs in grouped.items()]
+        run.submit(chat_id, deliver)
         
 # ---------------- UPI Subscribe ----------------
-from io import BytesIO
-import qrcode
+UPI_NOTE = "Job Bot Premium"
+
+def render_upi_qr(upi_id: str, amount: int, note: str = UPI_NOTE) -> bytes:
+    """PNG of a QR code for UPI payment. Rendered once per (UPI ID, amount, note); see media.py."""
+    from io import BytesIO
+    import qrcode  # pulls in PIL; only a media cache miss needs it
 
-async def generate_upi_qr(upi_id: str, amount: int, note: str = "Job Bot Premium"):
-    """Generate a QR code image for UPI payment."""
     upi_link = f"upi://pay?pa={upi_id}&pn=Vinod%20Kumar&am={amount}&cu=INR&tn={note}"
     qr = qrcode.make(upi_link)
     bio = BytesIO()
-    bio.name = "upi_qr.png"
     qr.save(bio, "PNG")
-    bio.seek(0)
-    return bio
+    return bio.getvalue()
 
 async def cmd_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
@@ -363,11 +502,12 @@ async def cmd_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="HTML"
     )
 
-    # Send the QR code
-    qr_image = await generate_upi_qr(UPI_ID, amount)
-    await context.bot.send_photo(
-        chat_id=chat_id,
-        photo=qr_image,
+    # Send the QR code (cached: rendered and uploaded once, then sent by file_id)
+    await get_media_cache().send(
+        context.bot, "photo", chat_id,
+        asset_key("upi_qr", UPI_ID, amount, UPI_NOTE),
+        lambda: render_upi_qr(UPI_ID, amount),
+        "upi_qr.png",
         caption=f"📷 Scan & Pay ₹{amount} to {UPI_ID} & upload its screenshot here"
     )
 
@@ -413,16 +553,9 @@ async def cmd_addpremium(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /addpremium <chat_id>")
         return
 
-    users = load_premium_users()
     expiry = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%d")
-    users[target_id] = expiry
-    save_premium_users(users)
-
-    # ✅ Also auto-add to subscribers.json
-    subs = load_json_file(SUBSCRIBERS_FILE, [])
-    if target_id not in subs:
-        subs.append(target_id)
-        save_json_file(SUBSCRIBERS_FILE, subs)
+    # ✅ Also auto-adds to subscribers
+    get_membership().grant_premium(target_id, expiry)
 
     await update.message.reply_text(f"✅ {target_id} added as Premium until {expiry}")
     try:
@@ -444,17 +577,9 @@ async def cmd_removepremium(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /removepremium <chat_id>")
         return
 
-    users = load_premium_users()
-    if target_id in users:
-        del users[target_id]
-        save_premium_users(users)
-
-        # 🔻 Also remove from subscribers.json
-        subs = load_json_file(SUBSCRIBERS_FILE, [])
-        if target_id in subs:
-            subs.remove(target_id)
-            save_json_file(SUBSCRIBERS_FILE, subs)
-
+    # 🔻 Also removes from subscribers
+    if get_membership().revoke_premium(target_id):
+        get_ledger().forget(target_id)
         await update.message.reply_text(f"❌ {target_id} removed from Premium and unsubscribed.")
         try:
             await context.bot.send_message(
@@ -470,14 +595,13 @@ async def cmd_removepremium(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def cmd_premiumstatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
 
-    users = load_premium_users()
-    subs = load_json_file(SUBSCRIBERS_FILE, [])
+    members = get_membership()
 
-    if user_id in users:
+    if members.has_premium_record(user_id):
         await update.message.reply_text(
             "✅ You are a Premium user. You will continue receiving unrestricted job updates."
         )
-    elif user_id in subs:
+    elif members.is_subscriber(user_id):
         await update.message.reply_text(
             "ℹ️ You are a Free user. You will get limited job alerts.\n\n"
             "👉 Use /subscribe to upgrade and unlock all job alerts."
@@ -501,41 +625,106 @@ async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /broadcast <message>")
         return
 
-    subs = load_json_file(SUBSCRIBERS_FILE, [])
-    for chat_id in subs:
+    # Runs in the background (and survives restarts); progress is edited into one message.
+    await get_broadcasts().start(context.bot, text, get_membership().subscriber_ids(),
+                                 admin_chat_id=update.effective_chat.id)
+
+
+def _broadcast_arg(context: ContextTypes.DEFAULT_TYPE, statuses):
+    """Broadcast named by the command's argument, else the newest one in `statuses`."""
+    manager = get_broadcasts()
+    if context.args:
         try:
-            await context.bot.send_message(chat_id=int(chat_id), text=text, parse_mode="HTML")
-        except Exception as e:
-            logger.warning(f"Failed to send to {chat_id}: {e}")
+            return manager.get(int(context.args[0].lstrip("#")))
+        except ValueError:
+            return None
+    return manager.latest(statuses)
+
+
+async def _control_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str, statuses):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ You are not allowed to use this command.")
+        return
+    b = _broadcast_arg(context, statuses)
+    if b is None:
+        await update.message.reply_text("ℹ️ No matching broadcast.")
+        return
+    manager = get_broadcasts()
+    if action == "resume":
+        ok = manager.resume(context.bot, b.id)
+    else:
+        ok = getattr(manager, action)(b.id)
+    if ok:
+        await update.message.reply_text(f"✅ Broadcast #{b.id}: {action} requested.")
+    else:
+        await update.message.reply_text(f"ℹ️ Broadcast #{b.id} is {b.status}; cannot {action}.")
 
-    await update.message.reply_text(f"✅ Broadcast sent to {len(subs)} subscriber(s).")
+
+async def cmd_pausebroadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _control_broadcast(update, context, "pause", ("running",))
+
+
+async def cmd_resumebroadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _control_broadcast(update, context, "resume", ("paused", "running"))
+
+
+async def cmd_cancelbroadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _control_broadcast(update, context, "cancel", ("running", "paused"))
+
+
+async def cmd_broadcasts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ You are not allowed to use this command.")
+        return
+    recent = get_broadcasts().list()
+    if not recent:
+        await update.message.reply_text("ℹ️ No broadcasts yet.")
+        return
+    await update.message.reply_text("\n\n".join(progress_text(b) for b in recent))
+
+
+async def resume_broadcasts(context: ContextTypes.DEFAULT_TYPE):
+    """Startup: continue broadcasts that were running when the last process stopped."""
+    get_broadcasts().resume_all(context.bot)
 
 
 # ---------------- check premium ----------------
 def is_premium_user(chat_id: int) -> bool:
-    users = load_premium_users()
-    exp = users.get(str(chat_id))
-    if not exp:
-        return False
-    try:
-        expiry_date = datetime.strptime(exp, "%Y-%m-%d").date()
-        return expiry_date >= datetime.utcnow().date()
-    except:
-        return False
+    return get_membership().is_premium(chat_id)
         
 # ---------------- Minimal HTTP server for Render ----------------
+def _last_check_age():
+    last = CHECK_SCHEDULER.last_success if CHECK_SCHEDULER else None
+    return None if last is None else time.time() - last.ended
+
+metrics.register(metrics.Gauge("jobbot_last_check_success_age_seconds",
+                               "Seconds since the last successful check_jobs run.", fn=_last_check_age))
+
+def health_response(path: str):
+    """(content type, body) for the health routes; shared by the polling and webhook servers."""
+    if path == "/health":
+        body = {"check_jobs": CHECK_SCHEDULER.health() if CHECK_SCHEDULER else None,
+                "chat_health": get_chat_health().health()}
+        return "application/json", json.dumps(body).encode("utf-8")
+    if path == "/metrics":
+        return metrics.CONTENT_TYPE, metrics.render().encode("utf-8")
+    if path == "/ping":
+        text = "✅ Bot is alive and ready!"
+        age = _last_check_age()
+        if age is not None:
+            text += f" Last successful check {int(age)}s ago."
+        elif CHECK_SCHEDULER is not None:
+            text += " No successful check yet."
+        return "text/plain; charset=utf-8", text.encode("utf-8")
+    return "text/plain; charset=utf-8", "✅ Bot is running on Render!".encode("utf-8")
+
 class SimpleHandler(BaseHTTPRequestHandler):
     def do_GET(self):
-        if self.path == "/ping":
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain; charset=utf-8")
-            self.end_headers()
-            self.wfile.write("✅ Bot is alive and ready!".encode("utf-8"))
-        else:
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain; charset=utf-8")
-            self.end_headers()
-            self.wfile.write("✅ Bot is running on Render!".encode("utf-8"))
+        content_type, body = health_response(self.path)
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        self.end_headers()
+        self.wfile.write(body)
 
     def do_HEAD(self):
         # Respond to HEAD requests like GET but without body
@@ -549,28 +738,97 @@ def run_http_server():
     print(f"HTTP server running on port {port}", flush=True)
     threading.Thread(target=server.serve_forever, daemon=True).start()
 
-# ---------------- main ----------------
-def main():
-    global BOT_RUNNING
-    if BOT_RUNNING:
-        print("Bot is already running. Exiting duplicate instance.")
-        return
-    BOT_RUNNING = True
-    
-    if "--once" in sys.argv:
-        bot = Bot(token=BOT_TOKEN)
-        asyncio.run(check_jobs(bot))
-        return
-    
-    # --- Lock must be acquired first ---
-    lock_file = acquire_lock_or_exit()  # exits if another instance is running
+# ---------------- webhook ----------------
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or getattr(config, "WEBHOOK_URL", None) or os.getenv("RENDER_EXTERNAL_URL")
+WEBHOOK_PATH = getattr(config, "WEBHOOK_PATH", "/telegram")
+# Telegram echoes this in X-Telegram-Bot-Api-Secret-Token; default is derived from the bot token.
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET") or getattr(config, "WEBHOOK_SECRET", None)
+                  or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode("utf-8")).hexdigest()[:32])
+WEBHOOK_CONCURRENT_UPDATES = int(getattr(config, "WEBHOOK_CONCURRENT_UPDATES", 16))
+# Point at a local stand-in of the Bot API for offline runs, e.g. "http://127.0.0.1:8081/bot".
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL") or getattr(config, "TELEGRAM_BASE_URL", None)
+
+def make_webhook_app(app, secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH):
+    """Tornado app: POST `path` feeds Telegram updates to `app`; GET serves the health routes."""
+    import tornado.web
+
+    class UpdateHandler(tornado.web.RequestHandler):
+        async def post(self):
+            token = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token") or ""
+            if not hmac.compare_digest(token.encode("utf-8"), secret.encode("utf-8")):
+                logger.warning("Webhook call with a bad secret token from %s", self.request.remote_ip)
+                self.set_status(403)
+                return
+            try:
+                update = Update.de_json(json.loads(self.request.body), app.bot)
+            except Exception as e:
+                logger.warning("Unparseable webhook payload: %s", e)
+                self.set_status(400)
+                return
+            # Acknowledge right away; handlers run on the application (concurrently).
+            await app.update_queue.put(update)
+            self.set_status(200)
+
+    class HealthHandler(tornado.web.RequestHandler):
+        def get(self):
+            content_type, body = health_response(self.request.path)
+            self.set_header("Content-Type", content_type)
+            self.write(body)
+
+        def head(self):
+            self.set_header("Content-Type", "text/plain; charset=utf-8")
+
+    return tornado.web.Application([(path, UpdateHandler), (r"/.*", HealthHandler)])
+
+async def run_webhook(app, port: int):
+    """--webhook: one async server for Telegram updates and health checks."""
+    import signal
+    import tornado.httpserver
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    async with app:
+        await app.start()
+        server = tornado.httpserver.HTTPServer(make_webhook_app(app))
+        server.listen(port)
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=WEBHOOK_CONCURRENT_UPDATES,
+            )
+        else:
+            logger.warning("WEBHOOK_URL not set; not registering the webhook with Telegram.")
+        print(f"Webhook server running on port {port}", flush=True)
+        try:
+            await stop.wait()
+        finally:
+            server.stop()
+            await app.stop()
 
-    # start HTTP server only if we are the active container
-    run_http_server()
+# ---------------- main ----------------
+async def run_once(bot: Bot):
+    """--once: answer from the disk snapshot, then let its refresh finish before exiting."""
+    await check_jobs(bot, prefer_cache=True)
+    await sheet_async.wait_for_refresh()
+
+def build_application(token: str = BOT_TOKEN, base_url: Optional[str] = TELEGRAM_BASE_URL,
+                      concurrent_updates: Optional[int] = None):
+    """The bot application with every command handler registered (no jobs scheduled)."""
+    builder = ApplicationBuilder().token(token)
+    if base_url:
+        builder = builder.base_url(base_url)
+    if concurrent_updates:
+        builder = builder.concurrent_updates(concurrent_updates)
+    app = builder.build()
 
-    # Build bot application
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-    
     # --- Handlers ---
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("stop", cmd_stop))
@@ -580,18 +838,59 @@ def main():
     app.add_handler(CommandHandler("removepremium", cmd_removepremium))
     app.add_handler(CommandHandler("premiumstatus", cmd_premiumstatus))
     app.add_handler(CommandHandler("broadcast", cmd_broadcast))
+    app.add_handler(CommandHandler("pausebroadcast", cmd_pausebroadcast))
+    app.add_handler(CommandHandler("resumebroadcast", cmd_resumebroadcast))
+    app.add_handler(CommandHandler("cancelbroadcast", cmd_cancelbroadcast))
+    app.add_handler(CommandHandler("broadcasts", cmd_broadcasts))
 
     app.add_handler(CallbackQueryHandler(button_handler))
 
     # ✅ Screenshot handler
     app.add_handler(MessageHandler(filters.PHOTO, handle_screenshot))
+    return app
+
+def main():
+    global BOT_RUNNING
+    if BOT_RUNNING:
+        print("Bot is already running. Exiting duplicate instance.")
+        return
+    BOT_RUNNING = True
+    
+    if "--once" in sys.argv:
+        bot = Bot(token=BOT_TOKEN, base_url=TELEGRAM_BASE_URL) if TELEGRAM_BASE_URL else Bot(token=BOT_TOKEN)
+        asyncio.run(run_once(bot))
+        return
+
+    if "--scrape" in sys.argv:
+        import scrapers
+        asyncio.run(scrapers.run_scrape())
+        return
+    
+    # --- Lock must be acquired first (normally already done above, before the imports) ---
+    lock_file = _LOCK_FILE or acquire_lock_or_exit()  # exits if another instance is running
+
+    webhook = "--webhook" in sys.argv
+    if not webhook:
+        # start HTTP server only if we are the active container
+        run_http_server()
+
+    app = build_application(concurrent_updates=WEBHOOK_CONCURRENT_UPDATES if webhook else None)
 
     # --- Job queue ---
-    app.job_queue.run_repeating(
-        lambda ctx: asyncio.create_task(check_jobs(ctx.bot)),
+    global CHECK_SCHEDULER
+    CHECK_SCHEDULER = Scheduler(
+        "check_jobs",
+        lambda: check_jobs(app.bot),
         interval=CHECK_INTERVAL_MINUTES * 60,
-        first=10,
+        min_interval=CHECK_MIN_INTERVAL_MINUTES * 60,
+        max_interval=CHECK_MAX_INTERVAL_MINUTES * 60,
     )
+    CHECK_SCHEDULER.start(app.job_queue, first=10)
+    app.job_queue.run_once(resume_broadcasts, when=5, name="resume_broadcasts")
+
+    if webhook:
+        asyncio.run(run_webhook(app, int(os.environ.get("PORT", 10000))))
+        return
 
     # --- Run polling safely ---
     try:
@@ -0,0 +1,264 @@
+# broadcasts.py
+# Admin broadcasts as persisted background jobs.
+#
+# /broadcast snapshots the subscriber list into the state store and returns at
+# once; a task works through it in batches of BATCH_SIZE on the shared rate
+# limiter. A batch's positions are claimed by moving the cursor (one commit),
+# each recipient is marked 'sending' just before its send, and the outcomes
+# are written when the batch ends. A restart resumes from the first recipient
+# never attempted; only the ones whose send was in flight are marked 'unknown'
+# rather than sent again, so nobody gets a broadcast twice and nobody else is
+# lost. The admin's progress message is edited every PROGRESS_SECONDS with
+# sent / failed / ETA.
+#
+# Pause and resume take effect between batches; cancel also skips the rest of
+# the batch in flight.
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest
+
+import config
+from chat_health import get_chat_health
+from delivery import DeliveryRun
+from membership import get_membership
+from state_store import StateStore, get_store
+
+log = logging.getLogger("broadcasts")
+
+BATCH_SIZE = int(getattr(config, "BROADCAST_BATCH_SIZE", 200))
+PROGRESS_SECONDS = float(getattr(config, "BROADCAST_PROGRESS_SECONDS", 5))
+
+ACTIVE = ("running", "paused")
+
+
+class Broadcast:
+    __slots__ = ("id", "text", "status", "cursor", "total", "admin_chat_id", "progress_message_id",
+                 "created_at", "finished_at", "counts", "resumed_at", "done_at_resume", "reported_at")
+
+    def __init__(self, row: tuple):
+        (self.id, self.text, self.status, self.cursor, self.total, self.admin_chat_id,
+         self.progress_message_id, self.created_at, self.finished_at) = row
+        self.counts: Dict[str, int] = {}
+        self.resumed_at = time.monotonic()
+        self.done_at_resume = 0
+        self.reported_at = 0.0
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.get(s, 0) for s in ("sent", "failed", "skipped", "unknown"))
+
+    def eta_seconds(self) -> Optional[float]:
+        """From this process's send rate; None until something was sent."""
+        sent_here = self.done - self.done_at_resume
+        elapsed = time.monotonic() - self.resumed_at
+        if sent_here <= 0 or elapsed <= 0:
+            return None
+        return (self.total - self.done) / (sent_here / elapsed)
+
+
+def _fmt_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+def progress_text(b: Broadcast) -> str:
+    icon = {"running": "📣", "paused": "⏸", "cancelled": "🛑", "done": "✅"}.get(b.status, "📣")
+    lines = [
+        f"{icon} Broadcast #{b.id}: {b.status}",
+        f"✅ Sent: {b.counts.get('sent', 0):,} / {b.total:,}",
+        f"❌ Failed: {b.counts.get('failed', 0):,}",
+    ]
+    if b.counts.get("skipped"):
+        lines.append(f"⏭ Skipped (unsubscribed / unreachable): {b.counts['skipped']:,}")
+    if b.counts.get("unknown"):
+        lines.append(f"❔ Unconfirmed (not retried): {b.counts['unknown']:,}")
+    if b.status == "running":
+        eta = b.eta_seconds()
+        lines.append(f"⏳ ETA: {_fmt_duration(eta) if eta is not None else '…'}")
+    return "\n".join(lines)
+
+
+class BroadcastManager:
+    def __init__(self, store: StateStore):
+        self.store = store
+        self.live: Dict[int, Broadcast] = {}       # broadcasts with a running task
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    # ---------------- lookups ----------------
+    def get(self, broadcast_id: int) -> Optional[Broadcast]:
+        if broadcast_id in self.live:
+            return self.live[broadcast_id]
+        for row in self.store.broadcasts():
+            if row[0] == broadcast_id:
+                b = Broadcast(row)
+                b.counts = self.store.broadcast_counts(b.id)
+                return b
+        return None
+
+    def latest(self, statuses=ACTIVE) -> Optional[Broadcast]:
+        rows = self.store.broadcasts(statuses)
+        return self.get(rows[0][0]) if rows else None
+
+    def list(self, limit: int = 5) -> List[Broadcast]:
+        return [self.get(row[0]) for row in self.store.broadcasts()[:limit]]
+
+    # ---------------- control ----------------
+    async def start(self, bot, text: str, chat_ids: List[int], admin_chat_id: Optional[int] = None) -> Broadcast:
+        bid = self.store.create_broadcast(text, chat_ids, admin_chat_id)
+        b = self.get(bid)
+        log.info("Broadcast #%d created for %d chat(s).", bid, b.total)
+        self._spawn(bot, b)
+        return b
+
+    def pause(self, broadcast_id: int) -> bool:
+        return self._set_status(broadcast_id, "paused", ("running",))
+
+    def cancel(self, broadcast_id: int) -> bool:
+        return self._set_status(broadcast_id, "cancelled", ACTIVE)
+
+    def resume(self, bot, broadcast_id: int) -> bool:
+        if broadcast_id in self.live:   # paused, but its task is still finishing the batch
+            return self._set_status(broadcast_id, "running", ("paused",))
+        b = self.get(broadcast_id)
+        if b is None or b.status not in ACTIVE:
+            return False
+        if b.status != "running":
+            self.store.set_broadcast_status(broadcast_id, "running")
+            b.status = "running"
+        self._spawn(bot, b)
+        return True
+
+    def resume_all(self, bot) -> int:
+        """Startup: pick up every broadcast that was running when the process stopped."""
+        resumed = 0
+        for row in self.store.broadcasts(("running",)):
+            if row[0] not in self.tasks:
+                self._spawn(bot, Broadcast(row))
+                resumed += 1
+        if resumed:
+            log.info("Resumed %d broadcast(s).", resumed)
+        return resumed
+
+    def _set_status(self, broadcast_id: int, status: str, allowed) -> bool:
+        b = self.live.get(broadcast_id) or self.get(broadcast_id)
+        if b is None or b.status not in allowed:
+            return False
+        self.store.set_broadcast_status(broadcast_id, status)
+        b.status = status
+        log.info("Broadcast #%d %s.", broadcast_id, status)
+        return True
+
+    # ---------------- running ----------------
+    def _spawn(self, bot, b: Broadcast):
+        self.live[b.id] = b
+        self.tasks[b.id] = asyncio.create_task(self._run(bot, b))
+
+    async def _run(self, bot, b: Broadcast):
+        unknown = self.store.settle_unconfirmed_broadcast(b.id)
+        if unknown:
+            log.warning("Broadcast #%d: %d recipient(s) were being sent to when it stopped; not resending.",
+                        b.id, unknown)
+        b.counts = self.store.broadcast_counts(b.id)
+        b.resumed_at, b.done_at_resume = time.monotonic(), b.done
+        try:
+            await self._report(bot, b, force=True)
+            while b.status == "running":
+                batch = self.store.claim_broadcast_batch(b.id, BATCH_SIZE)
+                if not batch:
+                    self.store.set_broadcast_status(b.id, "done")
+                    b.status = "done"
+                    break
+                await self._send_batch(bot, b, batch)
+                await self._report(bot, b)
+        except Exception:
+            log.exception("Broadcast #%d stopped", b.id)
+        finally:
+            self.tasks.pop(b.id, None)
+            self.live.pop(b.id, None)
+        await self._report(bot, b, force=True)
+        log.info("Broadcast #%d %s: %s", b.id, b.status, b.counts)
+
+    async def _send_batch(self, bot, b: Broadcast, batch: List[tuple]):
+        results = []
+        health, members = get_chat_health(), get_membership()
+
+        async def send_one(position: int, chat_id: int):
+            if b.status == "cancelled":
+                return   # left 'pending'; never sent
+            if not members.is_subscriber(chat_id) or health.should_skip(chat_id):
+                status = "skipped"   # unsubscribed or pruned since the snapshot, or backing off
+                results.append((position, status))
+                b.counts[status] = b.counts.get(status, 0) + 1
+                return
+            self.store.mark_broadcast_sending(b.id, position)
+            try:
+                await run.call(bot.send_message, chat_id=chat_id, text=b.text, parse_mode="HTML")
+                status = "sent"
+            except Exception as e:
+                log.warning("Broadcast #%d to %s failed: %s", b.id, chat_id, e)
+                status = "failed"
+            results.append((position, status))
+            b.counts[status] = b.counts.get(status, 0) + 1
+
+        try:
+            async with DeliveryRun(f"broadcast#{b.id}") as run:
+                for position, chat_id in batch:
+                    run.submit(chat_id, lambda p=position, c=chat_id: send_one(p, c))
+        finally:
+            # Also on shutdown mid-batch: whatever was confirmed is recorded.
+            self.store.record_broadcast_results(b.id, results)
+            health.flush()
+
+    async def _report(self, bot, b: Broadcast, force: bool = False):
+        """Edit the admin's progress message (at most every PROGRESS_SECONDS unless forced)."""
+        if b.admin_chat_id is None:
+            return
+        now = time.monotonic()
+        if not force and now - b.reported_at < PROGRESS_SECONDS:
+            return
+        b.reported_at = now
+        text = progress_text(b)
+        try:
+            if b.progress_message_id:
+                await bot.edit_message_text(chat_id=b.admin_chat_id, message_id=b.progress_message_id, text=text)
+                return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            log.info("Broadcast #%d: progress message not editable (%s); sending a new one.", b.id, e)
+        except Exception as e:
+            log.warning("Broadcast #%d: progress update failed: %s", b.id, e)
+            return
+        try:
+            msg = await bot.send_message(chat_id=b.admin_chat_id, text=text)
+            b.progress_message_id = msg.message_id
+            self.store.set_broadcast_progress_message(b.id, msg.message_id)
+        except Exception as e:
+            log.warning("Broadcast #%d: progress message failed: %s", b.id, e)
+
+
+_MANAGER: Optional[BroadcastManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_broadcasts() -> BroadcastManager:
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = BroadcastManager(get_store())
+        return _MANAGER
+
+
+def use_broadcasts(manager: Optional[BroadcastManager]):
+    """Swap the process-wide manager (benchmarks, tools); None rebuilds it on next use."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        _MANAGER = manager
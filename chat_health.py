@@ -0,0 +1,238 @@
+# chat_health.py
+# Which chats can still be delivered to.
+#
+# Every failed Telegram call in a DeliveryRun is classified here:
+#   permanent - the bot was blocked or kicked, the chat does not exist, the
+#               user deleted their account. The chat is queued for pruning.
+#   transient - timeouts and network errors. The chat is backed off
+#               (BACKOFF_BASE_SECONDS, doubling per consecutive failure, capped
+#               at BACKOFF_MAX_SECONDS); a success clears the counter.
+#               Transient failures are only held until flush(): if more than
+#               OUTAGE_SHARE of the chats tried since the last flush failed that
+#               way (or none succeeded), the bot's own connection was down, and
+#               nobody is backed off for it.
+#   other     - errors about the message, not the chat ("message is not
+#               modified", "message to edit not found"): ignored here.
+#
+# flush() applies the queued changes in one commit: dead chats leave the
+# subscribers, their message ids and the delivery ledger (a premium record is
+# kept, so /start brings a paying user back), and failure counters are saved.
+import logging
+import threading
+import time
+from collections import Counter as TallyCounter
+from typing import Dict, Optional, Set, Tuple
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter
+
+import config
+from ledger import get_ledger
+from membership import get_membership
+from metrics import Counter, Gauge, register
+from state_store import StateStore, get_store
+
+log = logging.getLogger("chat_health")
+
+BACKOFF_BASE_SECONDS = float(getattr(config, "CHAT_BACKOFF_BASE_SECONDS", 15 * 60))
+BACKOFF_MAX_SECONDS = float(getattr(config, "CHAT_BACKOFF_MAX_SECONDS", 24 * 3600))
+OUTAGE_SHARE = float(getattr(config, "CHAT_OUTAGE_SHARE", 0.2))   # transient-failing share that means "our network"
+
+# Lower-cased fragments of Telegram error texts that mean the chat is gone for good.
+PERMANENT_ERRORS = (
+    ("blocked", "bot was blocked"),
+    ("kicked", "bot was kicked"),
+    ("deactivated", "user is deactivated"),
+    ("chat_not_found", "chat not found"),
+    ("chat_not_found", "peer_id_invalid"),
+    ("chat_not_found", "user not found"),
+    ("not_member", "bot is not a member"),
+)
+
+CHAT_FAILURES = register(Counter("jobbot_chat_failures_total", "Failed sends by chat-health classification."))
+PRUNED_CHATS = register(Counter("jobbot_pruned_chats_total", "Subscribers removed after a permanent failure."))
+BACKOFF_SKIPS = register(Counter("jobbot_chat_backoff_skips_total", "Deliveries skipped for chats in backoff."))
+
+
+def classify(error: BaseException) -> Tuple[str, str]:
+    """(kind, reason) with kind one of "permanent", "transient", "other"."""
+    if isinstance(error, RetryAfter) or isinstance(error, ChatMigrated):
+        return "other", type(error).__name__     # flood control is global; migration is not death
+    text = str(error).lower()
+    if isinstance(error, (Forbidden, BadRequest)):
+        for reason, fragment in PERMANENT_ERRORS:
+            if fragment in text:
+                return "permanent", reason
+        if isinstance(error, Forbidden):
+            return "permanent", "forbidden"
+        return "other", "bad_request"
+    if isinstance(error, NetworkError):            # includes TimedOut
+        return "transient", type(error).__name__
+    return "other", type(error).__name__
+
+
+class PruneStats:
+    def __init__(self):
+        self.pruned = TallyCounter()   # reason -> chats removed (this process)
+        self.permanent_failures = 0
+        self.transient_failures = 0
+        self.backoff_skips = 0         # deliveries not attempted because the chat was backing off
+        self.outages = 0               # flushes whose transient failures were put down to the bot's network
+        self.last_flush: Optional[float] = None
+
+
+class ChatHealth:
+    def __init__(self, store: StateStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self.failures: Dict[int, Tuple[int, float]] = store.chat_failures()   # chat -> (count, retry_at)
+        self.pruned_total = int(store.get_meta("pruned_chats_total") or 0)
+        self.stats = PruneStats()
+        self._dead: Dict[int, str] = {}        # queued for pruning: chat -> reason
+        self._transient: Dict[int, str] = {}   # transient failures since the last flush: chat -> last error
+        self._ok: Set[int] = set()             # chats with a successful call since the last flush
+        self._dirty: Dict[int, str] = {}       # failure counters to save: chat -> last error
+        self._cleared: Set[int] = set()        # failure counters to drop
+
+    # ---------------- lookups ----------------
+    def in_backoff(self, chat_id: int, now: Optional[float] = None) -> bool:
+        entry = self.failures.get(int(chat_id))
+        return entry is not None and entry[1] > (now or time.time())
+
+    def is_dead(self, chat_id: int) -> bool:
+        return int(chat_id) in self._dead
+
+    def should_skip(self, chat_id: int) -> bool:
+        """True for a chat queued for pruning or backing off; counts as a reclaimed send."""
+        if self.is_dead(chat_id) or self.in_backoff(chat_id):
+            self.stats.backoff_skips += 1
+            BACKOFF_SKIPS.inc()
+            return True
+        return False
+
+    # ---------------- recording ----------------
+    def record_ok(self, chat_id: int):
+        chat_id = int(chat_id)
+        with self._lock:
+            self._ok.add(chat_id)
+            self._transient.pop(chat_id, None)
+            if chat_id in self.failures:
+                self.failures.pop(chat_id, None)
+                self._dirty.pop(chat_id, None)
+                self._cleared.add(chat_id)
+
+    def record_failure(self, chat_id: int, error: BaseException) -> str:
+        """Classify a failed call for `chat_id`; returns the kind."""
+        kind, reason = classify(error)
+        CHAT_FAILURES.inc(kind=kind, reason=reason)
+        chat_id = int(chat_id)
+        with self._lock:
+            if kind == "permanent":
+                self.stats.permanent_failures += 1
+                if chat_id not in self._dead:
+                    self._dead[chat_id] = reason
+                    log.info("Chat %s is unreachable (%s); queued for pruning.", chat_id, reason)
+            elif kind == "transient":
+                self.stats.transient_failures += 1
+                self._transient[chat_id] = f"{type(error).__name__}: {error}"[:200]
+        return kind
+
+    def _back_off(self, transient: Dict[int, str]):
+        now = time.time()
+        for chat_id, err in transient.items():
+            count = self.failures.get(chat_id, (0, 0.0))[0] + 1
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (count - 1))
+            self.failures[chat_id] = (count, now + delay)
+            self._dirty[chat_id] = err
+            self._cleared.discard(chat_id)
+
+    # ---------------- applying ----------------
+    def flush(self) -> int:
+        """Back off transient failures (unless they look like an outage on our side), prune
+        queued dead chats and save failure counters, in one commit. Returns chats pruned."""
+        with self._lock:
+            transient, self._transient = self._transient, {}
+            ok, self._ok = self._ok, set()
+            if transient:
+                tried = ok | transient.keys()
+                if not ok or len(transient) / len(tried) > OUTAGE_SHARE:
+                    self.stats.outages += 1
+                    log.warning("⚠️ %d of %d chat(s) failed with network errors; treating it as an outage, "
+                                "no chat backed off.", len(transient), len(tried))
+                else:
+                    self._back_off(transient)
+            dead, self._dead = self._dead, {}
+            dirty, self._dirty = self._dirty, {}
+            cleared, self._cleared = self._cleared, set()
+            for chat_id in dead:
+                self.failures.pop(chat_id, None)
+                dirty.pop(chat_id, None)
+            counters = [(c, *self.failures[c], err) for c, err in dirty.items() if c in self.failures]
+        if not (dead or dirty or cleared):
+            return 0
+        with self.store.transaction():
+            if dead:
+                get_membership().remove_subscribers(dead)
+                self.store.drop_message_ids(dead)
+                get_ledger().forget_many(dead)
+                self.pruned_total += len(dead)
+                self.store.set_meta("pruned_chats_total", str(self.pruned_total))
+            self.store.clear_chat_failures(cleared | set(dead))
+            self.store.set_chat_failures(counters)
+        self.stats.last_flush = time.time()
+        if dead:
+            reasons = TallyCounter(dead.values())
+            with self._lock:
+                self.stats.pruned.update(reasons)
+            for reason, n in reasons.items():
+                PRUNED_CHATS.inc(n, reason=reason)
+            log.info("🧹 Pruned %d dead chat(s) (%s); %d chat(s) in backoff.", len(dead),
+                     ", ".join(f"{r} {n}" for r, n in reasons.most_common()), self.backing_off())
+        return len(dead)
+
+    # ---------------- reporting ----------------
+    # Called from the metrics/health server thread while the loop records and flushes:
+    # copy the dicts under the lock, never iterate them live.
+    def backing_off(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        with self._lock:
+            retry_ats = [retry_at for _, retry_at in self.failures.values()]
+        return sum(1 for retry_at in retry_ats if retry_at > now)
+
+    def health(self) -> dict:
+        with self._lock:
+            pruned = dict(self.stats.pruned)
+        return {
+            "pruned_total": self.pruned_total,
+            "pruned_this_process": pruned,
+            "permanent_failures": self.stats.permanent_failures,
+            "transient_failures": self.stats.transient_failures,
+            "in_backoff": self.backing_off(),
+            "backoff_skips": self.stats.backoff_skips,
+            "outages": self.stats.outages,
+            # Every pruned chat used to cost at least one failed call per check and per broadcast.
+            "reclaimed_sends_per_check": self.pruned_total,
+            "last_flush": self.stats.last_flush,
+        }
+
+
+_HEALTH: Optional[ChatHealth] = None
+_HEALTH_LOCK = threading.Lock()
+
+
+def get_chat_health() -> ChatHealth:
+    global _HEALTH
+    with _HEALTH_LOCK:
+        if _HEALTH is None:
+            _HEALTH = ChatHealth(get_store())
+        return _HEALTH
+
+
+def use_chat_health(health: Optional[ChatHealth]):
+    """Swap the process-wide tracker (benchmarks, tools); None rebuilds it on next use."""
+    global _HEALTH
+    with _HEALTH_LOCK:
+        _HEALTH = health
+
+
+register(Gauge("jobbot_chats_in_backoff", "Chats currently backing off after transient failures.",
+               fn=lambda: _HEALTH.backing_off() if _HEALTH is not None else None))
@@ -14,8 +14,20 @@ GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 
 SHEET_ID = "10TpLVJrWP60btW5plk6m7iMCXqZi9ZHLeV9z7QoqAL8"                # From Sheet URL
 SHEET_NAME = "Sheet1"                          # The tab name inside the Sheet
+SHEET_IO_WORKERS = 2        # threads used for blocking Google Sheets calls
+SHEET_IO_TIMEOUT = 60       # seconds before an async sheet call gives up
+SHEET_HTTP_TIMEOUT = 30     # per-request HTTP timeout for gspread
+SHEET_DELETE_BATCH_SIZE = 200  # max row ranges deleted in one batchUpdate
+SHEET_SNAPSHOT_MAX_AGE = 6 * 3600  # force a full sheet read after this many seconds, even if unchanged
+JOB_INDEX_RECONCILE_SECONDS = 24 * 3600  # re-read the sheet to rebuild the append dedupe index this often
+
+# --- On-disk sheet snapshot (cold start / offline fallback) ---
+SHEET_CACHE_FILE = "sheet_snapshot.json.gz"
+SHEET_CACHE_FRESH_SECONDS = 300          # serve without refreshing while younger than this
+SHEET_CACHE_MAX_STALE_SECONDS = 24 * 3600  # never serve a snapshot older than this
 ADMIN_ID = 1831664678   # 👈 replace with your own Telegram numeric user ID
 UPI_ID = "vinod.uptt@okaxis"  # 👈 your real UPI ID
+MEDIA_CACHE_DIR = "media_cache"  # rendered QR codes and other static media (file_ids live in the state DB)
 
 # --- Date Handling ---
 DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%d %b %Y"]  # Accepted input formats
@@ -27,12 +39,26 @@ RESEND_ALL_ON_NEW = True  # If True, send full active list on any new job; else
 # --- Filenames for persistence ---
 SENT_JOBS_FILE = "sent_jobs.json"
 SUBSCRIBERS_FILE = "subscribers.json"
+# State now lives in SQLite; the JSON files above are imported into it once.
+STATE_DB_FILE = "state.db"
 
 # --- Timezone ---
 TIMEZONE = pytz.timezone("Asia/Kolkata")
 
 CHECK_INTERVAL_MINUTES = 60  # how often to check jobs (in minutes)
 
+# --- Delivery (Telegram flood limits) ---
+DELIVERY_GLOBAL_RATE = 30     # messages/second across all chats
+DELIVERY_PER_CHAT_RATE = 1    # messages/second inside one chat
+DELIVERY_PER_CHAT_BURST = 3   # short burst allowed per chat
+DELIVERY_WORKERS = 20         # concurrent delivery workers per run
+DELIVERY_MAX_RETRIES = 3      # RetryAfter retries before giving up on a message
+BROADCAST_BATCH_SIZE = 200    # recipients claimed (checkpointed) per broadcast batch
+BROADCAST_PROGRESS_SECONDS = 5  # how often the admin's progress message is edited
+CHAT_BACKOFF_BASE_SECONDS = 15 * 60   # first pause for a chat after a transient send failure (doubles)
+CHAT_BACKOFF_MAX_SECONDS = 24 * 3600  # longest pause; blocked / deleted chats are pruned instead
+CHAT_OUTAGE_SHARE = 0.2               # more chats than this failing with network errors = our outage, no backoff
+
 # --- Sources ---
 # Toggle per-source. If RSS is available, mention it here, else "scraper"
 SOURCES = {
@@ -43,6 +69,23 @@ SOURCES = {
     "UPPSC": {"enabled": True, "method": "scraper", "url": "https://uppsc.up.nic.in/Notifications.aspx" },
 }
 
+# --- Webhook mode (python bot.py --webhook) ---
+# WEBHOOK_URL = "https://your-service.onrender.com"   # defaults to $WEBHOOK_URL / $RENDER_EXTERNAL_URL
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_CONCURRENT_UPDATES = 16   # handlers allowed to run at once
+# WEBHOOK_SECRET = "..."          # defaults to one derived from BOT_TOKEN
+# TELEGRAM_BASE_URL = "http://127.0.0.1:8081/bot"   # local Bot API stand-in for offline runs
+
+# --- Check scheduling (base interval: JOB_INTERVAL_MINUTES env, default 60) ---
+CHECK_MIN_INTERVAL_MINUTES = 30   # fastest while new jobs keep arriving
+# CHECK_MAX_INTERVAL_MINUTES = 180  # let a quiet sheet be checked less often (new jobs wait up to this long)
+CHECK_JITTER = 0.1                # +/- 10% on every interval
+
+# --- Scraping (python bot.py --scrape) ---
+SCRAPER_MAX_CONNECTIONS = 10   # pooled HTTP connections across all sources
+SCRAPER_PER_HOST_LIMIT = 2     # concurrent requests to any one site
+SCRAPER_TIMEOUT = 30           # seconds per request
+
 # --- Keywords (Optional filtering) ---
 # Leave empty list [] to allow all jobs
 KEYWORDS = [
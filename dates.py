@@ -0,0 +1,106 @@
+# dates.py
+# The one place "Last Date" strings are parsed.
+#
+# Each configured DATE_FORMATS entry is compiled to a regex once, so the common
+# case is a match plus a date() call instead of strptime's per-call format
+# parsing and exception handling. Results are memoized per raw string; a Job
+# (jobs.py) parses its date once at ingest, so later passes never parse again.
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable, Optional
+
+import config
+
+DATE_FORMATS = list(config.DATE_FORMATS)
+OUTPUT_DATE_FORMAT = getattr(config, "OUTPUT_DATE_FORMAT", "%d/%m/%Y")
+# Always accepted, as before, even if DATE_FORMATS leaves it out.
+FALLBACK_FORMAT = "%d %b %Y"
+
+_MONTH_ABBR = {m.lower(): i for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)}
+_MONTH_FULL = {m.lower(): i for i, m in enumerate(
+    ["January", "February", "March", "April", "May", "June", "July",
+     "August", "September", "October", "November", "December"], start=1)}
+
+# strptime directives the fast path understands; any other directive means
+# the format is handled by strptime alone.
+_DIRECTIVES = {
+    "d": r"(?P<d>\d{1,2})",
+    "m": r"(?P<m>\d{1,2})",
+    "Y": r"(?P<Y>\d{4})",
+    "b": r"(?P<b>[A-Za-z]{3})",
+    "B": r"(?P<B>[A-Za-z]{3,9})",
+}
+
+
+def _compile(fmt: str) -> Optional[Callable[[str], Optional[date]]]:
+    """Regex equivalent of datetime.strptime(s, fmt).date(), or None if `fmt`
+    uses a directive we do not translate."""
+    parts, i = [], 0
+    while i < len(fmt):
+        ch = fmt[i]
+        if ch == "%":
+            token = fmt[i + 1:i + 2]
+            if token not in _DIRECTIVES:
+                return None
+            parts.append(_DIRECTIVES[token])
+            i += 2
+        elif ch.isspace():
+            parts.append(r"\s+")
+            i += 1
+        else:
+            parts.append(re.escape(ch))
+            i += 1
+    pattern = re.compile("".join(parts) + r"\Z", re.IGNORECASE)
+
+    def parse(s: str) -> Optional[date]:
+        m = pattern.match(s)
+        if m is None:
+            return None
+        g = m.groupdict()
+        if "m" in g:
+            month = int(g["m"])
+        elif "b" in g:
+            month = _MONTH_ABBR.get(g["b"].lower())
+        else:
+            month = _MONTH_FULL.get(g["B"].lower())
+        if month is None:
+            return None
+        try:
+            return date(int(g["Y"]), month, int(g["d"]))
+        except ValueError:
+            return None
+
+    return parse
+
+
+def _strptime_parser(fmt: str) -> Callable[[str], Optional[date]]:
+    def parse(s: str) -> Optional[date]:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            return None
+    return parse
+
+
+_PARSERS = [_compile(f) or _strptime_parser(f)
+            for f in DATE_FORMATS + ([FALLBACK_FORMAT] if FALLBACK_FORMAT not in DATE_FORMATS else [])]
+
+
+@lru_cache(maxsize=int(getattr(config, "DATE_CACHE_SIZE", 8192)))
+def parse_date(s: str) -> Optional[date]:
+    """Parse a sheet "Last Date" value with the configured formats; None if none match."""
+    if not s:
+        return None
+    s = str(s).strip()
+    for parse in _PARSERS:
+        d = parse(s)
+        if d is not None:
+            return d
+    return None
+
+
+def format_date(d: Optional[date], raw: str = "") -> str:
+    """OUTPUT_DATE_FORMAT rendering of `d`, or the raw text if it did not parse."""
+    return d.strftime(OUTPUT_DATE_FORMAT) if d else raw
@@ -0,0 +1,233 @@
+# delivery.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram.error import RetryAfter
+
+import config
+from chat_health import ChatHealth, get_chat_health
+from metrics import API_CALLS, DELIVERY_QUEUE, RATE_LIMIT_WAIT
+
+log = logging.getLogger("delivery")
+
+# --- Telegram flood limits ---
+# ~30 messages/second across all chats, ~1 message/second inside one chat.
+GLOBAL_RATE = float(getattr(config, "DELIVERY_GLOBAL_RATE", 30))
+PER_CHAT_RATE = float(getattr(config, "DELIVERY_PER_CHAT_RATE", 1))
+PER_CHAT_BURST = int(getattr(config, "DELIVERY_PER_CHAT_BURST", 3))
+WORKERS = int(getattr(config, "DELIVERY_WORKERS", 20))
+MAX_RETRIES = int(getattr(config, "DELIVERY_MAX_RETRIES", 3))
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self) -> bool:
+        """Full and nobody waiting: dropping it and starting a new one changes nothing."""
+        if self._lock.locked():
+            return False
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Take one token, sleeping until one is available."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Process-wide limiter shared by every delivery run.
+
+    Holds the global bucket, one bucket per chat ("lane") and the per-lane
+    pause deadlines set by RetryAfter, so concurrent runs (hourly check,
+    /resendall, /broadcast) never add up past the Telegram limits. Lanes
+    and pauses are created on demand; sweep() drops the ones that no longer
+    hold anything back.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 per_chat_burst: int = PER_CHAT_BURST):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.lanes: Dict[int, TokenBucket] = {}
+        self.paused_until: Dict[int, float] = {}
+
+    def _lane(self, chat_id: int) -> TokenBucket:
+        bucket = self.lanes.get(chat_id)
+        if bucket is None:
+            bucket = self.lanes[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    def pause(self, chat_id: int, seconds: float):
+        until = time.monotonic() + seconds
+        if until > self.paused_until.get(chat_id, 0):
+            self.paused_until[chat_id] = until
+
+    def sweep(self) -> int:
+        """Forget expired pauses and lanes whose bucket has refilled. Returns lanes dropped."""
+        now = time.monotonic()
+        for chat_id, until in list(self.paused_until.items()):
+            if until <= now:
+                del self.paused_until[chat_id]
+        idle = [chat_id for chat_id, bucket in self.lanes.items()
+                if chat_id not in self.paused_until and bucket.idle()]
+        for chat_id in idle:
+            del self.lanes[chat_id]
+        return len(idle)
+
+    async def acquire(self, chat_id: int) -> float:
+        """Wait for the chat's lane and the global bucket. Returns seconds waited."""
+        started = time.monotonic()
+        until = self.paused_until.get(chat_id)
+        if until is not None:
+            delay = until - started
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.paused_until.pop(chat_id, None)
+        await self._lane(chat_id).acquire()
+        await self.global_bucket.acquire()
+        return time.monotonic() - started
+
+
+LIMITER = RateLimiter()
+
+
+def _retry_seconds(e: RetryAfter) -> float:
+    ra = e.retry_after
+    return ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra)
+
+
+class DeliveryStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.jobs = 0
+        self.calls = 0
+        self.failed = 0
+        self.retries = 0
+        self.avoided = 0          # calls skipped because the chat already shows this content
+        self.rate_limit_wait = 0.0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.calls / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}: {self.calls} API calls for {self.jobs} chats in {self.elapsed:.1f}s "
+            f"({self.throughput:.1f} msg/s), {self.avoided} avoided, {self.failed} failed, {self.retries} retried, "
+            f"{self.rate_limit_wait:.1f}s waiting on rate limits"
+        )
+
+
+class DeliveryRun:
+    """A bounded worker pool for one fan-out (one check, one resend, one broadcast).
+
+    Usage:
+        async with DeliveryRun("check_jobs") as run:
+            run.submit(chat_id, lambda: send_stuff(run, chat_id))
+        log.info(run.stats.summary())
+
+    Each submitted job is one coroutine per chat, so messages to the same
+    chat keep their order; jobs for different chats run in parallel. Every
+    Telegram API call inside a job must go through `run.call(...)` so it is
+    rate-limited and retried on RetryAfter. Failures are reported to the chat
+    health tracker; the caller decides when to flush() its pruning.
+    """
+
+    def __init__(self, name: str, workers: int = WORKERS, limiter: Optional[RateLimiter] = None,
+                 max_retries: int = MAX_RETRIES, health: Optional[ChatHealth] = None):
+        self.name = name
+        self.workers = workers
+        self.limiter = limiter or LIMITER
+        self.health = health or get_chat_health()
+        self.max_retries = max_retries
+        self.stats = DeliveryStats(name)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+
+    async def __aenter__(self):
+        self.stats.started = time.monotonic()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self._queue.join()
+        finally:
+            # Also when the join itself is cancelled (shutdown): no worker may outlive the run.
+            for t in self._tasks:
+                t.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.limiter.sweep()
+        self.stats.elapsed = time.monotonic() - self.stats.started
+        log.info("📊 %s", self.stats.summary())
+        return False
+
+    def submit(self, chat_id: int, job: Callable[[], Awaitable]):
+        self.stats.jobs += 1
+        DELIVERY_QUEUE.inc(run=self.name)
+        self._queue.put_nowait((chat_id, job))
+
+    async def _worker(self):
+        while True:
+            chat_id, job = await self._queue.get()
+            try:
+                await job()
+            except Exception as e:
+                log.warning("Delivery job for %s failed: %s", chat_id, e)
+            finally:
+                DELIVERY_QUEUE.dec(run=self.name)
+                self._queue.task_done()
+
+    async def call(self, method: Callable[..., Awaitable], *, chat_id: int, **kwargs):
+        """Rate-limited Telegram API call. Re-raises anything but RetryAfter."""
+        attempt = 0
+        name = getattr(method, "__name__", "call")
+        while True:
+            waited = await self.limiter.acquire(int(chat_id))
+            self.stats.rate_limit_wait += waited
+            RATE_LIMIT_WAIT.observe(waited)
+            try:
+                result = await method(chat_id=chat_id, **kwargs)
+                self.stats.calls += 1
+                API_CALLS.inc(method=name, outcome="ok")
+                self.health.record_ok(chat_id)
+                return result
+            except RetryAfter as e:
+                API_CALLS.inc(method=name, outcome="retry_after")
+                attempt += 1
+                wait = _retry_seconds(e)
+                self.limiter.pause(int(chat_id), wait)
+                if attempt > self.max_retries:
+                    self.stats.failed += 1
+                    raise
+                self.stats.retries += 1
+                log.info("Flood wait %.0fs on chat %s (attempt %d)", wait, chat_id, attempt)
+            except Exception as e:
+                API_CALLS.inc(method=name, outcome=type(e).__name__)
+                self.stats.failed += 1
+                self.health.record_failure(chat_id, e)
+                raise
@@ -0,0 +1,93 @@
+# job_index.py
+# Persistent set of dedupe keys for every job already in the sheet, so
+# append_new_jobs can reject duplicates without downloading the sheet.
+#
+# The index is rebuilt from the sheet snapshot whenever this process has a
+# newer one anyway, extended after each append, and reconciled with a full
+# sheet read every RECONCILE_SECONDS to pick up manual edits.
+import logging
+import re
+import threading
+import time
+from typing import Iterable, Optional, Set
+
+import config
+from state_store import StateStore, get_store
+
+log = logging.getLogger("job_index")
+
+RECONCILE_SECONDS = float(getattr(config, "JOB_INDEX_RECONCILE_SECONDS", 24 * 3600))
+
+_SPACE = re.compile(r"\s+")
+
+
+def dedupe_key(title: str, last_date: str) -> str:
+    """Like build_job_id, but insensitive to case and to runs of spaces/newlines,
+    so the same notice scraped with different formatting maps to one key."""
+    title = _SPACE.sub(" ", title or "").strip().casefold()
+    last_date = _SPACE.sub("", last_date or "")
+    return f"{title}|{last_date}"
+
+
+def job_key(job) -> str:
+    return dedupe_key(job.title, job.last_date)
+
+
+class JobIndex:
+    def __init__(self, store: StateStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self.keys: Set[str] = store.job_index_keys()
+        self.reconciled_at = float(store.get_meta("job_index_reconciled_at") or 0)
+        self.synced_version: Optional[int] = None   # SNAPSHOT.version last synced from (this process)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def needs_reconcile(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.reconciled_at >= RECONCILE_SECONDS
+
+    def sync(self, rows: Iterable[tuple], version: Optional[int] = None, reconciled: bool = False):
+        """Make the index equal to the keys of `rows` ((row, Job) pairs of a full sheet snapshot)."""
+        keys = {job_key(j) for _, j in rows}
+        with self._lock:
+            added, dropped = keys - self.keys, self.keys - keys
+            with self.store.transaction():
+                self.store.job_index_add(added)
+                self.store.job_index_drop(dropped)
+                if reconciled:
+                    self.reconciled_at = time.time()
+                    self.store.set_meta("job_index_reconciled_at", str(self.reconciled_at))
+            self.keys = keys
+            self.synced_version = version
+        if added or dropped:
+            log.info("Job index synced: +%d -%d (%d keys).", len(added), len(dropped), len(keys))
+
+    def add(self, keys: Iterable[str]):
+        keys = set(keys) - self.keys
+        if not keys:
+            return
+        with self._lock:
+            self.store.job_index_add(keys)
+            self.keys |= keys
+
+
+_INDEX: Optional[JobIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_job_index() -> JobIndex:
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = JobIndex(get_store())
+        return _INDEX
+
+
+def use_job_index(index: JobIndex):
+    global _INDEX
+    with _INDEX_LOCK:
+        _INDEX = index
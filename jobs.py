@@ -0,0 +1,91 @@
+# jobs.py
+# Job: one sheet row as a compact record. Fields are read once at ingest; the
+# parsed last date and a content hash are computed there too, so later passes
+# (expiry, grouping, rendering) only read slots. The job id is rebuilt on access
+# (an f-string, read once per row per check): storing it cost more memory than
+# the slots saved over a dict row.
+import hashlib
+import sys
+from typing import Callable, Dict, List, Sequence
+
+from dates import parse_date
+
+# === HEADERS must match your Google Sheet exactly ===
+HEADERS = [
+    "Job Title",
+    "Last Date",
+    "Age Limit",
+    "Qualification",
+    "Experience",
+    "Apply Link",
+    "Source",   # ✅ Keep Source column
+]
+
+# Job attribute for each column, in HEADERS order.
+FIELDS = ("title", "last_date", "age", "qualification", "experience", "link", "source")
+
+
+def build_job_id(title: str, last_date: str) -> str:
+    return f"{(title or '').strip().lower()}|{(last_date or '').strip()}"
+
+
+class Job:
+    __slots__ = FIELDS + ("deadline", "content_hash")
+
+    def __init__(self, title: str = "", last_date: str = "", age: str = "", qualification: str = "",
+                 experience: str = "", link: str = "", source: str = ""):
+        self.title = title
+        self.last_date = last_date
+        self.age = age
+        self.qualification = qualification
+        self.experience = experience
+        self.link = link
+        self.source = sys.intern(source)   # a handful of distinct values across the sheet
+        self.deadline = parse_date(last_date)
+        self.content_hash = hashlib.blake2b("\x1f".join(self.cells()).encode("utf-8"), digest_size=8).digest()
+
+    @classmethod
+    def from_cells(cls, cells: Sequence[object]) -> "Job":
+        """Build from HEADERS-ordered cells; short rows are padded, extra cells ignored."""
+        width = len(FIELDS)
+        cells = list(cells[:width]) + [""] * (width - len(cells))
+        return cls(*(str(c).strip() for c in cells))
+
+    @classmethod
+    def from_scraped(cls, job: Dict[str, str]) -> "Job":
+        """Build from a scraper dict ({"title", "last_date", ..., "link", "source"})."""
+        return cls(*((job.get(f) or "").strip() for f in FIELDS))
+
+    @property
+    def job_id(self) -> str:
+        return build_job_id(self.title, self.last_date)
+
+    def cells(self) -> List[str]:
+        return [self.title, self.last_date, self.age, self.qualification, self.experience, self.link, self.source]
+
+    def __repr__(self):
+        return f"Job({self.title!r}, {self.last_date!r}, source={self.source!r})"
+
+
+def _header_key(name: object) -> str:
+    return str(name or "").strip().lower()
+
+
+def column_resolver(header_row: Sequence[object]) -> Callable[[Sequence[object]], Job]:
+    """Row -> Job builder for a sheet whose first row is `header_row`.
+
+    Columns are matched to HEADERS by case/whitespace-insensitive name once per
+    sheet; a header that is missing falls back to its HEADERS position. For the
+    usual exact header row this is plain positional reading.
+    """
+    found = {}
+    for pos, name in enumerate(header_row):
+        found.setdefault(_header_key(name), pos)
+    positions = [found.get(_header_key(h), i) for i, h in enumerate(HEADERS)]
+    if positions == list(range(len(HEADERS))):
+        return Job.from_cells
+
+    def build(cells: Sequence[object]) -> Job:
+        return Job.from_cells([cells[p] if p < len(cells) else "" for p in positions])
+
+    return build
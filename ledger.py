@@ -0,0 +1,148 @@
+# ledger.py
+# Per-subscriber record of which jobs each chat has already been sent.
+#
+# Storing one row per (chat, job) would make every run O(subscribers x jobs).
+# Instead the ledger keeps:
+#   baseline  - job hashes that every "synced" chat already has
+#   synced    - chats holding exactly the baseline (the normal case)
+#   partial   - the few chats that fell behind (new subscribers, failed sends),
+#               each with its own explicit set of hashes
+# A run computes `delta = active - baseline` once and hands it to every synced
+# chat, so the per-run work is proportional to the number of changes plus the
+# handful of partial chats, not subscribers x jobs.
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from state_store import StateStore, get_store
+
+log = logging.getLogger("ledger")
+
+
+def job_hash(job_id: str) -> int:
+    """Fixed-width (signed 64-bit) hash of a build_job_id() string; fits an SQLite INTEGER."""
+    digest = hashlib.blake2b(job_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class DeliveryLedger:
+    def __init__(self, store: StateStore):
+        self.store = store
+        if not store.get_meta("ledger_migrated"):
+            self._migrate()
+        self.baseline: Set[int] = store.ledger_baseline()
+        self.synced: Set[int] = store.ledger_synced()
+        self.partial: Dict[int, Set[int]] = store.ledger_partial()
+
+    def _migrate(self):
+        # The old global sent_jobs list meant "already announced"; treat every
+        # current subscriber as holding it so the switch does not re-send everything.
+        hashes = {job_hash(j) for j in self.store.sent_jobs()}
+        chats = [int(c) for c in self.store.subscribers()]
+        with self.store.transaction():
+            self.store.ledger_add_baseline(hashes)
+            self.store.ledger_set_synced(chats, True)
+            self.store.set_meta("ledger_migrated", str(time.time()))
+        log.info("Ledger migrated: %d job ids, %d synced chats.", len(hashes), len(chats))
+
+    # ---------------- per-run diff ----------------
+    def collect_garbage(self, active: Set[int]) -> int:
+        """Forget hashes of jobs that are no longer active. Returns how many baseline ids expired."""
+        expired = self.baseline - active
+        dropped = []
+        for chat_id, have in self.partial.items():
+            gone = have - active
+            if gone:
+                have -= gone
+                dropped.extend((chat_id, h) for h in gone)
+        if expired or dropped:
+            with self.store.transaction():
+                self.store.ledger_drop_baseline(expired)
+                self.store.ledger_drop_partial(dropped)
+            self.baseline -= expired
+        return len(expired)
+
+    def delta(self, active: Set[int]) -> Set[int]:
+        """Jobs new since the baseline; what every synced chat is missing."""
+        return active - self.baseline
+
+    def pending(self, chat_id: int, active: Set[int], delta: Set[int]) -> Set[int]:
+        if chat_id in self.synced:
+            return delta
+        return active - self.partial.get(chat_id, set())
+
+    def all_synced(self, chat_ids: Set[int]) -> bool:
+        return chat_ids <= self.synced
+
+    def commit_run(self, active: Set[int], delivered: Iterable[int], failed: Iterable[int]):
+        """Close a run: the baseline becomes `active`. Chats in `delivered` now hold all
+        of it; chats in `failed` keep exactly what they had before the run."""
+        old_baseline = self.baseline
+        with self.store.transaction():
+            behind = [c for c in failed if c in self.synced]
+            if behind:
+                self.synced.difference_update(behind)
+                self.store.ledger_set_synced(behind, False)
+                for chat_id in behind:
+                    self.partial[chat_id] = set(old_baseline)
+                    self.store.ledger_add_partial((chat_id, h) for h in old_baseline)
+
+            caught_up = [c for c in delivered if c not in self.synced]
+            if caught_up:
+                self.synced.update(caught_up)
+                self.store.ledger_set_synced(caught_up, True)
+                gone = [c for c in caught_up if self.partial.pop(c, None) is not None]
+                self.store.ledger_drop_partial_chats(gone)
+
+            self.store.ledger_add_baseline(active - old_baseline)
+        self.baseline = set(active)
+
+    # ---------------- single-chat updates ----------------
+    def mark_delivered(self, chat_id: int, active: Set[int]):
+        """A chat was just sent every active job (e.g. /resendall)."""
+        chat_id = int(chat_id)
+        with self.store.transaction():
+            if active == self.baseline:
+                self.synced.add(chat_id)
+                self.store.ledger_set_synced([chat_id], True)
+                if self.partial.pop(chat_id, None) is not None:
+                    self.store.ledger_drop_partial_chats([chat_id])
+                return
+            self.synced.discard(chat_id)
+            self.store.ledger_set_synced([chat_id], False)
+            self.partial[chat_id] = set(active)
+            self.store.ledger_drop_partial_chats([chat_id])
+            self.store.ledger_add_partial((chat_id, h) for h in active)
+
+    def forget(self, chat_id: int):
+        """Drop a chat entirely (unsubscribed). If it comes back it starts from scratch."""
+        self.forget_many([chat_id])
+
+    def forget_many(self, chat_ids: Iterable[int]):
+        chat_ids = [int(c) for c in chat_ids]
+        with self.store.transaction():
+            self.synced.difference_update(chat_ids)
+            for chat_id in chat_ids:
+                self.partial.pop(chat_id, None)
+            self.store.ledger_set_synced(chat_ids, False)
+            self.store.ledger_drop_partial_chats(chat_ids)
+
+
+_LEDGER: Optional[DeliveryLedger] = None
+_LEDGER_LOCK = threading.Lock()
+
+
+def get_ledger() -> DeliveryLedger:
+    global _LEDGER
+    with _LEDGER_LOCK:
+        if _LEDGER is None:
+            _LEDGER = DeliveryLedger(get_store())
+        return _LEDGER
+
+
+def use_ledger(ledger: DeliveryLedger):
+    global _LEDGER
+    with _LEDGER_LOCK:
+        _LEDGER = ledger
@@ -0,0 +1,167 @@
+# media.py
+# Static media the bot sends over and over (the UPI QR code, any fixed image or
+# document): rendered once, kept in memory and on disk, and uploaded to Telegram
+# once. The file_id Telegram returns for that upload is kept in the state store
+# and sent instead of the bytes from then on; if Telegram rejects a stored
+# file_id (bot token changed, file expired) the asset is uploaded again.
+#
+#   key = asset_key("upi_qr", upi_id, amount, note)
+#   await get_media_cache().send(bot, "photo", chat_id, key, render, "upi_qr.png", caption=...)
+import hashlib
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from telegram import InputFile
+from telegram.error import BadRequest
+
+import config
+from metrics import Counter, register
+from state_store import StateStore, get_store
+
+log = logging.getLogger("media")
+
+MEDIA_CACHE_DIR = getattr(config, "MEDIA_CACHE_DIR", "media_cache")
+
+# Bump when a renderer's output changes, so old files and file_ids are not reused.
+RENDER_VERSION = 1
+
+# Lower-cased fragments of the BadRequest texts that mean the stored file_id itself is unusable.
+STALE_FILE_ID_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference expired",
+    "file_id_invalid",
+    "wrong type of the web page content",
+)
+
+MEDIA_SENDS = register(Counter("jobbot_media_sends_total", "Static media sends by how the file was supplied."))
+
+
+def asset_key(kind: str, *params) -> str:
+    """Stable key for an asset rendered from `params`, e.g. ("upi_qr", upi_id, amount, note)."""
+    digest = hashlib.sha1("\x1f".join(map(str, params)).encode("utf-8")).hexdigest()[:16]
+    return f"{kind}-v{RENDER_VERSION}-{digest}"
+
+
+def file_asset(path: str) -> Callable[[], bytes]:
+    """Renderer for media that already exists as a file."""
+    def read() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def _sent_file_id(message, kind: str) -> Optional[str]:
+    if kind == "photo":
+        return message.photo[-1].file_id if message.photo else None
+    media = getattr(message, kind, None)
+    return media.file_id if media is not None else None
+
+
+class MediaStats:
+    def __init__(self):
+        self.file_id_sends = 0    # no bytes uploaded
+        self.uploads = 0
+        self.renders = 0          # cache misses in memory and on disk
+        self.stale_file_ids = 0   # rejected by Telegram and re-uploaded
+
+
+class MediaCache:
+    def __init__(self, store: StateStore, directory: str = MEDIA_CACHE_DIR):
+        self.store = store
+        self.directory = directory
+        self._bytes: Dict[str, bytes] = {}
+        self._file_ids: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self.stats = MediaStats()
+
+    # ---------------- bytes ----------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get_bytes(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Asset bytes from memory, else disk, else render() (and keep them in both)."""
+        with self._lock:
+            data = self._bytes.get(key)
+            if data is not None:
+                return data
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = render()
+                self.stats.renders += 1
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    tmp = f"{path}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    log.warning("Could not write %s to the media cache: %s", key, e)
+            self._bytes[key] = data
+            return data
+
+    # ---------------- file ids ----------------
+    def file_id(self, key: str) -> Optional[str]:
+        if key not in self._file_ids:
+            self._file_ids[key] = self.store.media_file_id(key)
+        return self._file_ids[key]
+
+    def _remember(self, key: str, file_id: Optional[str]):
+        self._file_ids[key] = file_id
+        if file_id:
+            self.store.set_media_file_id(key, file_id)
+        else:
+            self.store.drop_media_file_id(key)
+
+    # ---------------- sending ----------------
+    async def send(self, bot, kind: str, chat_id, key: str, render: Callable[[], bytes],
+                   filename: str, **kwargs):
+        """bot.send_<kind>(chat_id, <the asset>, **kwargs): by file_id when Telegram already
+        has it, otherwise an upload whose file_id is kept for next time."""
+        method = getattr(bot, f"send_{kind}")
+        file_id = self.file_id(key)
+        if file_id:
+            try:
+                message = await method(chat_id=chat_id, **{kind: file_id}, **kwargs)
+                self.stats.file_id_sends += 1
+                MEDIA_SENDS.inc(via="file_id")
+                return message
+            except BadRequest as e:
+                if not any(fragment in str(e).lower() for fragment in STALE_FILE_ID_ERRORS):
+                    raise   # about the chat or the caption, not the file: keep the file_id
+                log.warning("Stored file_id for %s rejected (%s); uploading again.", key, e)
+                self.stats.stale_file_ids += 1
+                self._remember(key, None)
+
+        upload = InputFile(self.get_bytes(key, render), filename=filename)
+        message = await method(chat_id=chat_id, **{kind: upload}, **kwargs)
+        self.stats.uploads += 1
+        MEDIA_SENDS.inc(via="upload")
+        new_id = _sent_file_id(message, kind)
+        if new_id:
+            self._remember(key, new_id)
+        return message
+
+
+_CACHE: Optional[MediaCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_media_cache() -> MediaCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = MediaCache(get_store())
+        return _CACHE
+
+
+def use_media_cache(cache: Optional[MediaCache]):
+    """Swap the process-wide cache (benchmarks, tools); None rebuilds it on next use."""
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = cache
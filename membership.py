@@ -0,0 +1,108 @@
+# membership.py
+# Process-wide in-memory index of subscribers and premium expiry dates.
+# Loaded from the state store once; every change goes to the store first
+# and then to the index (write-through), so lookups never touch disk.
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from state_store import StateStore, get_store
+
+log = logging.getLogger("membership")
+
+
+def _parse_expiry(exp: str) -> Optional[date]:
+    try:
+        return datetime.strptime(exp, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+class MembershipIndex:
+    def __init__(self, store: StateStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self.subscribers: Set[int] = {int(c) for c in store.subscribers()}
+        self.premium: Dict[int, Optional[date]] = {
+            int(c): _parse_expiry(e) for c, e in store.premium_users().items()
+        }
+        log.info("Membership index loaded: %d subscribers, %d premium.",
+                 len(self.subscribers), len(self.premium))
+
+    # ---------------- lookups ----------------
+    def subscriber_ids(self) -> List[int]:
+        with self._lock:
+            return list(self.subscribers)
+
+    def is_subscriber(self, chat_id) -> bool:
+        return int(chat_id) in self.subscribers
+
+    def has_premium_record(self, chat_id) -> bool:
+        return int(chat_id) in self.premium
+
+    def is_premium(self, chat_id, today: Optional[date] = None) -> bool:
+        expiry = self.premium.get(int(chat_id))
+        if expiry is None:
+            return False
+        return expiry >= (today or datetime.utcnow().date())
+
+    # ---------------- write-through updates ----------------
+    def add_subscriber(self, chat_id) -> bool:
+        """Returns True if the chat was not subscribed before."""
+        with self._lock:
+            is_new = self.store.add_subscriber(chat_id)
+            self.subscribers.add(int(chat_id))
+            return is_new
+
+    def remove_subscriber(self, chat_id) -> bool:
+        with self._lock:
+            removed = self.store.remove_subscriber(chat_id)
+            self.subscribers.discard(int(chat_id))
+            return removed
+
+    def remove_subscribers(self, chat_ids: Iterable[int]):
+        """Batch removal in one commit (dead-chat pruning)."""
+        chat_ids = [int(c) for c in chat_ids]
+        with self._lock:
+            self.store.remove_subscribers(chat_ids)
+            self.subscribers.difference_update(chat_ids)
+
+    def grant_premium(self, chat_id, expiry: str):
+        """Set premium expiry and make sure the chat is subscribed, in one commit."""
+        with self._lock:
+            with self.store.transaction():
+                self.store.set_premium(chat_id, expiry)
+                self.store.add_subscriber(chat_id)
+            self.premium[int(chat_id)] = _parse_expiry(expiry)
+            self.subscribers.add(int(chat_id))
+
+    def revoke_premium(self, chat_id) -> bool:
+        """Drop premium and unsubscribe. Returns False if the chat had no premium record."""
+        with self._lock:
+            with self.store.transaction():
+                removed = self.store.remove_premium(chat_id)
+                if removed:
+                    self.store.remove_subscriber(chat_id)
+            if removed:
+                self.premium.pop(int(chat_id), None)
+                self.subscribers.discard(int(chat_id))
+            return removed
+
+
+_INDEX: Optional[MembershipIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_membership() -> MembershipIndex:
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = MembershipIndex(get_store())
+        return _INDEX
+
+
+def use_membership(index: MembershipIndex):
+    global _INDEX
+    with _INDEX_LOCK:
+        _INDEX = index
@@ -0,0 +1,193 @@
+# metrics.py
+# Minimal in-process metrics with Prometheus text exposition (GET /metrics).
+#
+#   API_CALLS.inc(method="sendMessage", outcome="ok")
+#   with stage("render"): ...
+#   @traced("sheet_read")
+#   async def read(...): ...
+#
+# No client library: a handful of counters, gauges and fixed-bucket histograms
+# guarded by one lock is all the bot needs.
+import asyncio
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+_LOCK = threading.Lock()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    """Incremented directly, or read at scrape time from `fn` (a count kept elsewhere)."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        with _LOCK:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(_key(labels), 0)
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            return [f"{self.name} {_fmt_value(self.fn())}"]
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self.values.items())]
+
+
+class Gauge:
+    """Set directly, or computed at scrape time from `fn`."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        with _LOCK:
+            self.values[_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        with _LOCK:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            v = self.fn()
+            return [] if v is None else [f"{self.name} {_fmt_value(v)}"]
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self.values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.series: Dict[LabelKey, list] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        with _LOCK:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def count(self, **labels) -> int:
+        s = self.series.get(_key(labels))
+        return s[-1] if s else 0
+
+    def sum(self, **labels) -> float:
+        s = self.series.get(_key(labels))
+        return s[-2] if s else 0.0
+
+    def samples(self) -> List[str]:
+        out = []
+        for key, s in sorted(self.series.items()):
+            for bound, n in zip(self.buckets, s):
+                out.append(f"{self.name}_bucket{_fmt_labels(key, [('le', _fmt_value(bound))])} {n}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {s[-1]}")
+        return out
+
+
+REGISTRY: List[object] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format (0.0.4)."""
+    lines = []
+    with _LOCK:
+        for m in REGISTRY:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------- the bot's metrics ----------------
+STAGE_SECONDS = register(Histogram("jobbot_stage_seconds", "Time spent per pipeline stage."))
+API_CALLS = register(Counter("jobbot_telegram_api_calls_total", "Telegram API calls by method and outcome."))
+RATE_LIMIT_WAIT = register(Histogram("jobbot_rate_limit_wait_seconds", "Time a call waited on the rate limiter.",
+                                     buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60)))
+DELIVERY_QUEUE = register(Gauge("jobbot_delivery_queue_depth", "Delivery jobs queued or running, by run."))
+STORE_WRITE_SECONDS = register(Histogram("jobbot_store_write_seconds", "State store commit latency.",
+                                         buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)))
+
+
+# ---------------- tracing ----------------
+@contextmanager
+def stage(name: str):
+    """Time a block into jobbot_stage_seconds{stage=name}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def traced(name: str):
+    """Decorator: time every call of a sync or async function as stage `name`."""
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
@@ -0,0 +1,144 @@
+# scheduler.py
+# Runs the periodic job check one at a time on the bot's job queue.
+#
+# Each run schedules the next one when it finishes (job_queue.run_once), so a
+# slow run pushes the next tick back instead of overlapping it. A trigger that
+# arrives while a run is in progress is coalesced into a single follow-up run.
+# The interval adapts: it halves when a run found changes and grows slowly
+# back while nothing changes, never drops below a few run durations, and gets
+# +/- JITTER so restarts do not line up on the same second. By default it
+# never grows past the base interval, so adapting only ever checks sooner.
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional
+
+import config
+
+log = logging.getLogger("scheduler")
+
+JITTER = float(getattr(config, "CHECK_JITTER", 0.1))            # +/- fraction of the interval
+BACKOFF = float(getattr(config, "CHECK_BACKOFF", 1.25))         # growth per quiet run
+DUTY_FACTOR = float(getattr(config, "CHECK_DUTY_FACTOR", 4))    # interval >= this x run duration
+HISTORY = 50
+
+
+class RunRecord:
+    __slots__ = ("started", "ended", "outcome", "changed", "error")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.ended: Optional[float] = None
+        self.outcome = "running"     # running | ok | failed
+        self.changed = False
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.ended or time.time()) - self.started
+
+
+class Scheduler:
+    def __init__(self, name: str, fn: Callable[[], Awaitable[Optional[bool]]], interval: float,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 jitter: float = JITTER):
+        """`fn` returns True when the run found something changed (drives the interval)."""
+        self.name = name
+        self.fn = fn
+        self.base_interval = interval
+        self.min_interval = min_interval or interval / 2
+        self.max_interval = max_interval or interval
+        self.interval = interval
+        self.jitter = jitter
+        self.runs: Deque[RunRecord] = deque(maxlen=HISTORY)
+        self.last_success: Optional[RunRecord] = None
+        self.next_run_at: Optional[float] = None
+        self.coalesced = 0
+        self._lock = asyncio.Lock()
+        self._again = False
+        self._job_queue = None
+
+    # ---------------- running ----------------
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def trigger(self) -> bool:
+        """Run now, or if a run is in progress, ask it for one more pass. Returns False if coalesced."""
+        if self._lock.locked():
+            self._again = True
+            self.coalesced += 1
+            log.info("%s still running; tick coalesced.", self.name)
+            return False
+        async with self._lock:
+            while True:
+                self._again = False
+                await self._run_once()
+                if not self._again:
+                    return True
+
+    async def _run_once(self):
+        record = RunRecord(time.time())
+        self.runs.append(record)
+        try:
+            record.changed = bool(await self.fn())
+            record.outcome = "ok"
+        except Exception as e:
+            record.outcome = "failed"
+            record.error = f"{type(e).__name__}: {e}"
+            log.exception("%s run failed", self.name)
+        finally:
+            record.ended = time.time()
+        if record.outcome == "ok":
+            self.last_success = record
+        self._adapt(record)
+        log.info("%s %s in %.1fs (changed=%s); next interval %.0fs.",
+                 self.name, record.outcome, record.duration, record.changed, self.interval)
+
+    def _adapt(self, record: RunRecord):
+        if record.changed:
+            interval = self.interval / 2
+        elif record.outcome == "ok":
+            interval = self.interval * BACKOFF
+        else:
+            interval = self.base_interval
+        interval = max(interval, record.duration * DUTY_FACTOR)
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+
+    def next_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # ---------------- job queue ----------------
+    def start(self, job_queue, first: float = 10):
+        """Chain runs on a python-telegram-bot JobQueue, first one after `first` seconds."""
+        self._job_queue = job_queue
+        self._schedule(first)
+
+    def _schedule(self, delay: float):
+        self.next_run_at = time.time() + delay
+        self._job_queue.run_once(self._tick, when=delay, name=self.name)
+
+    async def _tick(self, context=None):
+        try:
+            await self.trigger()
+        finally:
+            self._schedule(self.next_delay())
+
+    # ---------------- health ----------------
+    def health(self) -> dict:
+        last = self.runs[-1] if self.runs else None
+        now = time.time()
+        return {
+            "running": self.running,
+            "interval_seconds": round(self.interval),
+            "next_run_in_seconds": round(self.next_run_at - now) if self.next_run_at else None,
+            "last_run": None if last is None else {
+                "started": last.started, "ended": last.ended,
+                "outcome": last.outcome, "changed": last.changed, "error": last.error,
+            },
+            "last_success": None if self.last_success is None else self.last_success.ended,
+            "last_success_age_seconds": None if self.last_success is None else round(now - self.last_success.ended),
+            "coalesced_ticks": self.coalesced,
+        }
@@ -0,0 +1,330 @@
+# scrapers.py
+# Ingestion: fetch every enabled source in config.SOURCES concurrently and turn
+# RSS / HTML listings into the job dicts sheet_utils.append_new_jobs expects:
+#   {"title", "last_date", "age", "qualification", "experience", "link", "source"}
+#
+# run_scrape() revalidates each page with its stored ETag / Last-Modified and
+# compares a hash of the body; a page that has not changed is neither parsed
+# nor appended. Validators are only saved after the append succeeded, so a
+# failed append is retried on the next run instead of being cached away.
+#
+# Items without a recognisable last date are dropped: the sheet purge keys on
+# Last Date, so an undated row would never expire, and a made-up date would
+# change the title|date dedupe key and re-add the row on every run. Items whose
+# last date has already passed are dropped too; appended, they would be purged
+# on the next check and appended again on the next scrape.
+import asyncio
+import hashlib
+import logging
+import re
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+import config
+from dates import parse_date
+from metrics import Counter, register
+
+log = logging.getLogger("scrapers")
+
+SOURCES = getattr(config, "SOURCES", {})
+KEYWORDS = [k.lower() for k in getattr(config, "KEYWORDS", [])]
+OUTPUT_DATE_FORMAT = getattr(config, "OUTPUT_DATE_FORMAT", "%d/%m/%Y")
+
+MAX_CONNECTIONS = int(getattr(config, "SCRAPER_MAX_CONNECTIONS", 10))
+PER_HOST_LIMIT = int(getattr(config, "SCRAPER_PER_HOST_LIMIT", 2))
+TIMEOUT = float(getattr(config, "SCRAPER_TIMEOUT", 30))
+USER_AGENT = getattr(config, "SCRAPER_USER_AGENT", "Mozilla/5.0 (compatible; JobAlertBot/1.0)")
+
+SCRAPE_PAGES = register(Counter("jobbot_scrape_pages_total",
+                                "Source page fetches by result (not_modified, unchanged, changed, error)."))
+SCRAPE_SKIPPED = register(Counter("jobbot_scrape_items_skipped_total",
+                                  "Parsed items not appended, by reason (undated, closed)."))
+
+# Link texts that look like a recruitment notice rather than site navigation.
+JOB_HINT = re.compile(
+    r"recruit|vacanc|advertisement|advt|notification|apprentice|fellow|engagement|"
+    r"walk.?in|post of|posts of|appointment|selection|examination",
+    re.IGNORECASE,
+)
+MIN_TITLE_LEN = 15
+
+
+# ---------------- parsing helpers ----------------
+def _clean(text: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _numeric_date(m) -> datetime:
+    return datetime(int(m[3]), int(m[2]), int(m[1]))
+
+
+def _named_date(m) -> datetime:
+    return datetime.strptime(f"{m[1]} {m[2][:3]} {m[3]}", "%d %b %Y")
+
+
+DATE_PATTERNS = [
+    (re.compile(r"\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b"), _numeric_date),                          # 20/10/2025
+    (re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]{3,9})\.?,?\s+(\d{4})\b"), _named_date),   # 20th Oct 2025
+]
+
+
+def extract_last_date(text: str) -> str:
+    """Latest date mentioned in `text` (closing dates come after opening dates),
+    formatted as OUTPUT_DATE_FORMAT; "" if none."""
+    found = []
+    for pat, build in DATE_PATTERNS:
+        for m in pat.finditer(text or ""):
+            try:
+                found.append(build(m))
+            except ValueError:
+                continue
+    return max(found).strftime(OUTPUT_DATE_FORMAT) if found else ""
+
+
+def _wanted(title: str) -> bool:
+    if len(title) < MIN_TITLE_LEN:
+        return False
+    low = title.lower()
+    return not KEYWORDS or any(k in low for k in KEYWORDS)
+
+
+def _job(source: str, title: str, link: str, context: str) -> Dict[str, str]:
+    return {
+        "title": title,
+        "last_date": extract_last_date(context),
+        "age": "",
+        "qualification": "",
+        "experience": "",
+        "link": link,
+        "source": source,
+    }
+
+
+# ---------------- parsers ----------------
+def parse_rss(source: str, base_url: str, body: str) -> List[Dict[str, str]]:
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError as e:
+        log.warning("%s: invalid RSS: %s", source, e)
+        return []
+    jobs = []
+    for item in root.iter("item"):
+        title = _clean(item.findtext("title"))
+        if not _wanted(title):
+            continue
+        link = urljoin(base_url, _clean(item.findtext("link")))
+        context = f"{title} {_clean(item.findtext('description'))}"
+        jobs.append(_job(source, title, link, context))
+    return jobs
+
+
+def parse_html(source: str, base_url: str, body: str) -> List[Dict[str, str]]:
+    """Generic listing parser: every link whose text reads like a recruitment notice.
+    The last date is looked for in the surrounding table row / list item."""
+    soup = BeautifulSoup(body, "html.parser")
+    jobs, seen = [], set()
+    for a in soup.find_all("a", href=True):
+        title = _clean(a.get_text(" "))
+        container = a.find_parent(["tr", "li"]) or a.parent
+        context = _clean(container.get_text(" ")) if container else title
+        if not _wanted(title) or not (JOB_HINT.search(title) or JOB_HINT.search(context)):
+            continue
+        link = urljoin(base_url, a["href"])
+        if (title, link) in seen:
+            continue
+        seen.add((title, link))
+        jobs.append(_job(source, title, link, context))
+    return jobs
+
+
+PARSERS = {
+    "rss": parse_rss,
+    "scraper": parse_html,
+}
+
+
+# ---------------- fetching ----------------
+class SourceStats:
+    def __init__(self):
+        self.not_modified = 0   # 304 from the server
+        self.unchanged = 0      # 200, but the same bytes as last time
+        self.changed = 0        # parsed
+        self.errors = 0
+        self.undated = 0        # parsed, but dropped for having no last date
+        self.expired = 0        # parsed, but the last date has passed
+
+    @property
+    def hits(self) -> int:
+        return self.not_modified + self.unchanged
+
+    @property
+    def misses(self) -> int:
+        return self.changed
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+STATS: Dict[str, SourceStats] = {}
+
+
+def source_stats(name: str) -> SourceStats:
+    stats = STATS.get(name)
+    if stats is None:
+        stats = STATS[name] = SourceStats()
+    return stats
+
+
+def _body_hash(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+class Scraper:
+    """Pooled async HTTP client with a per-host concurrency cap.
+
+    With `validators` ({url: (etag, last_modified, content_hash)}) requests are
+    conditional and unchanged pages are skipped; the validators of pages that
+    were parsed are collected in `fresh` for the caller to persist."""
+
+    def __init__(self, per_host: int = PER_HOST_LIMIT, client: Optional[httpx.AsyncClient] = None,
+                 validators: Optional[Dict[str, Tuple[Optional[str], Optional[str], str]]] = None):
+        self.per_host = per_host
+        self._client = client
+        self._own_client = client is None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.validators = validators
+        self.fresh: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+
+    async def __aenter__(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=TIMEOUT,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._own_client and self._client is not None:
+            await self._client.aclose()
+        return False
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        sem = self._host_limits.get(host)
+        if sem is None:
+            sem = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        async with self._host_limit(url):
+            resp = await self._client.get(url, headers=headers)
+            if resp.status_code != 304:
+                resp.raise_for_status()
+            return resp
+
+    async def scrape_source(self, name: str, cfg: dict) -> List[Dict[str, str]]:
+        parser = PARSERS.get(cfg.get("method", "scraper"))
+        if parser is None:
+            log.warning("%s: unknown method %r, skipped", name, cfg.get("method"))
+            return []
+        url = cfg["url"]
+        stats = source_stats(name)
+        cached = self.validators.get(url) if self.validators is not None else None
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        try:
+            resp = await self.fetch(url, headers)
+        except Exception as e:
+            stats.errors += 1
+            SCRAPE_PAGES.inc(source=name, result="error")
+            log.warning("%s: fetch failed: %s", name, e)
+            return []
+        if resp.status_code == 304:
+            stats.not_modified += 1
+            SCRAPE_PAGES.inc(source=name, result="not_modified")
+            log.info("%s: not modified", name)
+            return []
+
+        digest = _body_hash(resp.content)
+        if cached and cached[2] == digest:
+            stats.unchanged += 1
+            SCRAPE_PAGES.inc(source=name, result="unchanged")
+            log.info("%s: unchanged", name)
+            return []
+        stats.changed += 1
+        SCRAPE_PAGES.inc(source=name, result="changed")
+        if self.validators is not None:
+            self.fresh[url] = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"), digest)
+        parsed = parser(name, str(resp.url), resp.text)
+        jobs, undated, expired = [], 0, 0
+        today = date.today()
+        for job in parsed:
+            deadline = parse_date(job["last_date"]) if job["last_date"] else None
+            if deadline is None:
+                undated += 1
+            elif deadline < today:
+                expired += 1
+            else:
+                jobs.append(job)
+        stats.undated += undated
+        stats.expired += expired
+        if undated:
+            SCRAPE_SKIPPED.inc(undated, source=name, reason="undated")
+        if expired:
+            SCRAPE_SKIPPED.inc(expired, source=name, reason="closed")
+        if undated or expired:
+            log.info("%s: %d job(s) parsed, skipped %d without a last date and %d already closed",
+                     name, len(jobs), undated, expired)
+        else:
+            log.info("%s: %d job(s) parsed", name, len(jobs))
+        return jobs
+
+    async def scrape_many(self, sources: Dict[str, dict]) -> List[Dict[str, str]]:
+        enabled = {n: c for n, c in sources.items() if c.get("enabled", True) and c.get("url")}
+        results = await asyncio.gather(*(self.scrape_source(n, c) for n, c in enabled.items()))
+        return [job for jobs in results for job in jobs]
+
+
+async def scrape_all(sources: Optional[Dict[str, dict]] = None) -> List[Dict[str, str]]:
+    """Fetch and parse every enabled source concurrently (unconditionally, no cache)."""
+    async with Scraper() as scraper:
+        return await scraper.scrape_many(SOURCES if sources is None else sources)
+
+
+def stats_summary() -> str:
+    return ", ".join(f"{n} {s.hits}/{s.hits + s.misses} hit" + (f" {s.errors} err" if s.errors else "")
+                     + (f" {s.undated} undated" if s.undated else "")
+                     + (f" {s.expired} closed" if s.expired else "")
+                     for n, s in sorted(STATS.items()))
+
+
+async def run_scrape(sources: Optional[Dict[str, dict]] = None) -> int:
+    """--scrape: pull every changed source and append new rows to the sheet. Returns jobs found."""
+    import sheet_async  # needs Google credentials; parsing above does not
+    from state_store import get_store
+
+    store = get_store()
+    async with Scraper(validators=store.http_cache()) as scraper:
+        jobs = await scraper.scrape_many(SOURCES if sources is None else sources)
+    if not scraper.fresh:
+        log.info("All sources unchanged; nothing to append. (%s)", stats_summary())
+        return 0
+    log.info("Scraped %d job(s) from %d changed source(s). (%s)", len(jobs), len(scraper.fresh), stats_summary())
+    if jobs:
+        await sheet_async.append_new_jobs(jobs)
+    store.set_http_cache(scraper.fresh)
+    return len(jobs)
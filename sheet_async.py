@@ -0,0 +1,160 @@
+# sheet_async.py
+# Async front for sheet_utils: every gspread call runs on a small dedicated
+# thread pool so a slow Sheets round-trip never blocks the bot's event loop.
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import config
+import sheet_cache
+import sheet_utils
+from jobs import Job
+
+log = logging.getLogger("sheet_async")
+
+SHEET_IO_WORKERS = int(getattr(config, "SHEET_IO_WORKERS", 2))
+SHEET_IO_TIMEOUT = float(getattr(config, "SHEET_IO_TIMEOUT", 60))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=SHEET_IO_WORKERS, thread_name_prefix="sheet-io")
+_REFRESH_TASK: Optional[asyncio.Task] = None
+
+
+async def run_sheet_call(fn, *args, timeout: Optional[float] = SHEET_IO_TIMEOUT, **kwargs):
+    """Run a blocking sheet call on the sheet I/O pool.
+
+    Raises asyncio.TimeoutError after `timeout` seconds. On timeout or
+    cancellation a call that has not started yet is dropped from the pool;
+    one already in flight finishes in its thread (bounded by the gspread
+    HTTP timeout) and its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(_EXECUTOR, functools.partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(fut, timeout)
+    except asyncio.TimeoutError:
+        log.warning("Sheet call %s timed out after %ss", getattr(fn, "__name__", fn), timeout)
+        raise
+
+
+async def read_sheet_rows() -> List[Tuple[int, Job]]:
+    return await run_sheet_call(sheet_utils.read_sheet_rows)
+
+
+async def remove_expired_rows() -> List[Tuple[int, Job]]:
+    return await run_sheet_call(sheet_utils.remove_expired_rows)
+
+
+def snapshot_version() -> int:
+    """Bumped on every real sheet fetch; unchanged version == nothing new in the sheet."""
+    return sheet_utils.SNAPSHOT.version
+
+
+async def append_new_jobs(jobs: List[Dict[str, str]]):
+    return await run_sheet_call(sheet_utils.append_new_jobs, jobs)
+
+
+# ---------------- cached active rows ----------------
+_FETCH_LOCK = threading.Lock()
+
+
+def _fetch_active_rows() -> List[Tuple[int, Job]]:
+    """Read -> purge -> save as one step on one thread. Overlapping refreshes (the
+    scheduled check, a /resendall cache miss, a background refresh) queue up here
+    instead of interleaving their deletes. The disk snapshot is only rewritten
+    when the rows changed (a new fetch, including the one after a purge)."""
+    with _FETCH_LOCK:
+        sheet_utils.read_sheet_rows()
+        rows = sheet_utils.remove_expired_rows()
+        snapshot = sheet_utils.SNAPSHOT
+        if snapshot.version != snapshot.persisted_version:
+            try:
+                sheet_cache.save(rows)
+                snapshot.persisted_version = snapshot.version
+            except Exception as e:
+                log.warning("Could not persist sheet snapshot: %s", e)
+        return rows
+
+
+async def fetch_active_rows() -> List[Tuple[int, Job]]:
+    """Read the sheet, purge expired rows and persist the result as the new disk snapshot."""
+    return await run_sheet_call(_fetch_active_rows)
+
+
+def _drop_expired(rows: List[tuple]) -> List[tuple]:
+    today = date.today()
+    out = []
+    for idx, job in rows:
+        if job.deadline is None or job.deadline >= today:
+            out.append((idx, job))
+    return out
+
+
+def refresh_in_background() -> Optional[asyncio.Task]:
+    """Start (or join) one background fetch_active_rows(). Skipped while another fetch
+    holds _FETCH_LOCK: that one saves a fresh snapshot anyway, and a refresh queued
+    behind it would only park a sheet I/O thread."""
+    global _REFRESH_TASK
+    if _FETCH_LOCK.locked() and (_REFRESH_TASK is None or _REFRESH_TASK.done()):
+        return None
+    if _REFRESH_TASK is None or _REFRESH_TASK.done():
+        _REFRESH_TASK = asyncio.create_task(fetch_active_rows())
+        _REFRESH_TASK.add_done_callback(_log_refresh_failure)
+    return _REFRESH_TASK
+
+
+def _log_refresh_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("Background sheet refresh failed: %s", task.exception())
+
+
+async def wait_for_refresh():
+    """Let a pending background refresh finish (e.g. before a --once process exits)."""
+    if _REFRESH_TASK is not None:
+        await asyncio.gather(_REFRESH_TASK, return_exceptions=True)
+
+
+async def _load_snapshot() -> Optional[sheet_cache.CachedSnapshot]:
+    """The disk snapshot, never via the sheet I/O pool (whose threads may all be
+    waiting on Sheets): from memory, or read once on the loop's default executor."""
+    snap = sheet_cache.memo()
+    if snap is None:
+        snap = await asyncio.get_running_loop().run_in_executor(None, sheet_cache.load)
+    return snap
+
+
+async def active_rows(prefer_cache: bool = False) -> List[Tuple[int, Job]]:
+    """Active (non-expired) rows.
+
+    With `prefer_cache`, a disk snapshot younger than SHEET_CACHE_MAX_STALE_SECONDS
+    is served immediately (expired rows filtered in memory) and, once older than
+    SHEET_CACHE_FRESH_SECONDS, refreshed in the background. Without it the sheet
+    is read now, falling back to a usable snapshot only if the read fails.
+    """
+    stats = sheet_cache.STATS
+    if prefer_cache:
+        snap = await _load_snapshot()
+        if sheet_cache.usable(snap):
+            stats.hits += 1
+            stats.last_age = snap.age
+            if snap.age > sheet_cache.FRESH_SECONDS:
+                refresh_in_background()
+            log.info("Serving sheet snapshot from disk (age %.0fs, hit rate %.0f%%)",
+                     snap.age, stats.hit_rate * 100)
+            return _drop_expired(snap.rows)
+        stats.misses += 1
+
+    try:
+        return await fetch_active_rows()
+    except Exception as e:
+        if not prefer_cache:
+            raise
+        snap = await _load_snapshot()
+        if not sheet_cache.usable(snap):
+            raise
+        log.warning("Sheet read failed (%s); falling back to %.0fs old snapshot.", e, snap.age)
+        stats.last_age = snap.age
+        return _drop_expired(snap.rows)
@@ -0,0 +1,103 @@
+# sheet_cache.py
+# Last good (canonical, non-expired) sheet rows persisted on disk, so a cold
+# start or a Sheets outage can still answer from data that is a bit old.
+import gzip
+import json
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+import config
+from jobs import HEADERS, Job
+from metrics import Counter, Gauge, register
+
+log = logging.getLogger("sheet_cache")
+
+CACHE_FILE = getattr(config, "SHEET_CACHE_FILE", "sheet_snapshot.json.gz")
+# Younger than this: serve without refreshing. Older than MAX_STALE: never serve.
+FRESH_SECONDS = float(getattr(config, "SHEET_CACHE_FRESH_SECONDS", 300))
+MAX_STALE_SECONDS = float(getattr(config, "SHEET_CACHE_MAX_STALE_SECONDS", 24 * 3600))
+
+FORMAT_VERSION = 1
+
+
+class CachedSnapshot:
+    __slots__ = ("saved_at", "rows")
+
+    def __init__(self, saved_at: float, rows: List[Tuple[int, Job]]):
+        self.saved_at = saved_at
+        self.rows = rows
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.saved_at)
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.last_age: Optional[float] = None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+STATS = CacheStats()
+_MEMO: Optional[CachedSnapshot] = None
+
+register(Counter("jobbot_sheet_cache_hits_total", "Reads answered from the disk snapshot.", fn=lambda: STATS.hits))
+register(Counter("jobbot_sheet_cache_misses_total", "Reads that had to go to the sheet.", fn=lambda: STATS.misses))
+register(Gauge("jobbot_sheet_cache_hit_ratio", "Disk snapshot hit rate since start.", fn=lambda: STATS.hit_rate))
+register(Gauge("jobbot_sheet_cache_age_seconds", "Age of the disk snapshot when it was last served.",
+               fn=lambda: STATS.last_age))
+
+
+def save(rows: List[Tuple[int, Job]], path: str = CACHE_FILE):
+    """Write rows as gzip'd JSON arrays in HEADERS order; atomic via rename."""
+    global _MEMO
+    saved_at = time.time()
+    payload = {
+        "v": FORMAT_VERSION,
+        "saved_at": saved_at,
+        "headers": HEADERS,
+        "rows": [[idx] + job.cells() for idx, job in rows],
+    }
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    _MEMO = CachedSnapshot(saved_at, rows)
+
+
+def memo() -> Optional[CachedSnapshot]:
+    """The snapshot already in memory (last saved or loaded), without touching the disk."""
+    return _MEMO
+
+
+def load(path: str = CACHE_FILE) -> Optional[CachedSnapshot]:
+    """Last saved snapshot, or None if missing, unreadable or from another format/header set."""
+    global _MEMO
+    if _MEMO is not None:
+        return _MEMO
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except Exception as e:
+        log.warning("Ignoring unreadable sheet cache %s: %s", path, e)
+        return None
+    if payload.get("v") != FORMAT_VERSION or payload.get("headers") != HEADERS:
+        log.info("Ignoring sheet cache with a different format or headers.")
+        return None
+    rows = [(rec[0], Job.from_cells(rec[1:])) for rec in payload.get("rows", [])]
+    _MEMO = CachedSnapshot(float(payload.get("saved_at", 0)), rows)
+    return _MEMO
+
+
+def usable(snap: Optional[CachedSnapshot]) -> bool:
+    return snap is not None and snap.age <= MAX_STALE_SECONDS
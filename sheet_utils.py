@@ -2,13 +2,15 @@
 import logging
 import os
 import json
-from typing import List, Dict, Tuple
-from datetime import datetime, date
-
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+from datetime import date
 
 import config
+from job_index import get_job_index, job_key
+from metrics import traced
+from jobs import HEADERS, Job, build_job_id, column_resolver  # noqa: F401  (re-exported)
 
 log = logging.getLogger("sheet_utils")
 
@@ -17,155 +19,322 @@ SHEET_ID = getattr(config, "SHEET_ID", None)
 GOOGLE_SHEET_NAME = getattr(config, "GOOGLE_SHEET_NAME", None)  # fallback
 SHEET_NAME = getattr(config, "SHEET_NAME", "Sheet1")
 
-DATE_FORMATS = config.DATE_FORMATS
-OUTPUT_DATE_FORMAT = getattr(config, "OUTPUT_DATE_FORMAT", "%d/%m/%Y")
+# Full refetch at least this often even if the change probe says "unchanged" (seconds).
+SNAPSHOT_MAX_AGE = float(getattr(config, "SHEET_SNAPSHOT_MAX_AGE", 6 * 3600))
+
+# Most deleteDimension ranges sent in one batchUpdate before we split the payload.
+DELETE_BATCH_SIZE = int(getattr(config, "SHEET_DELETE_BATCH_SIZE", 200))
 
 SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
-# 🔑 Load credentials either from environment variable (Render) or local file (Windows/Linux)
-try:
-    if os.getenv("GOOGLE_CREDENTIALS_JSON"):
-        # Render: credentials stored as JSON string in environment variable
-        creds_json = json.loads(os.environ["GOOGLE_CREDENTIALS_JSON"])
-        CREDS = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, SCOPE)
-    else:
-        # Local: credentials.json file on disk
-        GOOGLE_CREDENTIALS_FILE = getattr(config, "GOOGLE_CREDENTIALS_FILE", "E:/credentials.json")
-        CREDS = ServiceAccountCredentials.from_json_keyfile_name(GOOGLE_CREDENTIALS_FILE, SCOPE)
-except Exception as e:
-    raise RuntimeError(f"❌ Failed to load Google credentials: {e}")
-
-GC = gspread.authorize(CREDS)
-
-# === HEADERS must match your Google Sheet exactly ===
-HEADERS = [
-    "Job Title",
-    "Last Date",
-    "Age Limit",
-    "Qualification",
-    "Experience",
-    "Apply Link",
-    "Source",   # ✅ Keep Source column
-]
+_GC = None
+_GC_LOCK = threading.Lock()
+
+def get_client():
+    """Authorized gspread client, created on first sheet access (not at import),
+    so processes that never touch the sheet skip the gspread/oauth2client import and auth."""
+    global _GC
+    with _GC_LOCK:
+        if _GC is not None:
+            return _GC
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        # 🔑 Load credentials either from environment variable (Render) or local file (Windows/Linux)
+        try:
+            if os.getenv("GOOGLE_CREDENTIALS_JSON"):
+                # Render: credentials stored as JSON string in environment variable
+                creds_json = json.loads(os.environ["GOOGLE_CREDENTIALS_JSON"])
+                creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_json, SCOPE)
+            else:
+                # Local: credentials.json file on disk
+                credentials_file = getattr(config, "GOOGLE_CREDENTIALS_FILE", "E:/credentials.json")
+                creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_file, SCOPE)
+        except Exception as e:
+            raise RuntimeError(f"❌ Failed to load Google credentials: {e}")
+
+        gc = gspread.authorize(creds)
+        # Bound every HTTP round-trip so a hung request cannot pin a sheet I/O thread forever.
+        gc.set_timeout(float(getattr(config, "SHEET_HTTP_TIMEOUT", 30)))
+        _GC = gc
+        return gc
+
+_WORKSHEET = None
+_WORKSHEET_LOCK = threading.Lock()
 
 def _open_worksheet():
-    if SHEET_ID:
-        sh = GC.open_by_key(SHEET_ID)
-    elif GOOGLE_SHEET_NAME:
-        sh = GC.open(GOOGLE_SHEET_NAME)
-    else:
-        raise RuntimeError("No SHEET_ID or GOOGLE_SHEET_NAME found in config.py")
-    try:
-        ws = sh.worksheet(SHEET_NAME)
-    except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title=SHEET_NAME, rows=200, cols=len(HEADERS))
-    return ws
-
-def ensure_headers(ws):
-    values = ws.get_all_values()
+    """Open the job worksheet once per process and reuse the handle."""
+    global _WORKSHEET
+    with _WORKSHEET_LOCK:
+        if _WORKSHEET is not None:
+            return _WORKSHEET
+        import gspread
+
+        gc = get_client()
+        if SHEET_ID:
+            sh = gc.open_by_key(SHEET_ID)
+        elif GOOGLE_SHEET_NAME:
+            sh = gc.open(GOOGLE_SHEET_NAME)
+        else:
+            raise RuntimeError("No SHEET_ID or GOOGLE_SHEET_NAME found in config.py")
+        try:
+            ws = sh.worksheet(SHEET_NAME)
+        except gspread.exceptions.WorksheetNotFound:
+            ws = sh.add_worksheet(title=SHEET_NAME, rows=200, cols=len(HEADERS))
+        _WORKSHEET = ws
+        return ws
+
+def _forget_worksheet():
+    global _WORKSHEET
+    with _WORKSHEET_LOCK:
+        _WORKSHEET = None
+
+def ensure_headers(ws, values: Optional[List[List[str]]] = None) -> bool:
+    """Make row 1 match HEADERS. Pass already-fetched `values` to avoid a read.
+    Returns True if the sheet was modified."""
+    if values is None:
+        values = ws.get_all_values()
     if not values or not values[0]:
         ws.update([HEADERS])
-        return
+        return True
     current = [c.strip() for c in values[0]]
     if current != HEADERS:
         ws.delete_rows(1)
         ws.insert_row(HEADERS, 1)
+        return True
+    return False
+
+def _rows_from_values(values: List[List[str]]) -> List[Tuple[int, Job]]:
+    """(sheet row number, Job) for every data row; columns are resolved once from row 1."""
+    build = column_resolver(values[0] if values else HEADERS)
+    return [(idx, build(raw)) for idx, raw in enumerate(values[1:], start=2)]
+
+def probe_modified_time(ws) -> Optional[str]:
+    """Cheap change probe: the spreadsheet's Drive modifiedTime (one small metadata call).
+    None (always do a full fetch) on gspread versions without get_lastUpdateTime: their
+    `lastUpdateTime` attribute is read once when the spreadsheet is opened and, with the
+    handle cached for the whole process, would report "unchanged" forever."""
+    sh = ws.spreadsheet
+    if hasattr(sh, "get_lastUpdateTime"):
+        return sh.get_lastUpdateTime()
+    return None
+
+class SheetSnapshot:
+    """In-memory copy of the job sheet, built from a single data-range read.
 
-def canonicalize_row(row: Dict[str, object]) -> Dict[str, str]:
-    norm = { (k or "").strip(): (v if v is not None else "") for k, v in row.items() }
-    out = {}
-    for h in HEADERS:
-        found_key = None
-        for k in norm.keys():
-            if k.strip().lower() == h.lower():
-                found_key = k
-                break
-        out[h] = str(norm.get(found_key, "")).strip() if found_key else ""
-    return out
-
-def parse_indian_date(s: str):
-    if not s:
-        return None
-    s = str(s).strip()
-    for fmt in DATE_FORMATS:
+    The worksheet handle is cached, headers are checked against the fetched
+    values (no extra read), and the parsed rows are reused until `invalidate()`
+    is called after a mutation or `refresh()` sees a change.
+
+    Before a full fetch, `refresh()` asks `probe(ws)` for a change token (the
+    Drive modifiedTime by default). If it matches the token of the last fetch
+    the previous rows are returned as-is and `changed` is False. A full fetch
+    is forced anyway once the snapshot is older than `max_age` seconds, and
+    whenever the probe fails. `version` goes up on every full fetch.
+    """
+
+    def __init__(self, open_worksheet=None, probe=probe_modified_time, max_age: float = SNAPSHOT_MAX_AGE):
+        self._open = open_worksheet or _open_worksheet
+        self._probe = probe
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._rows: Optional[List[Tuple[int, Job]]] = None
+        self._token = None
+        self._fetched_at = 0.0
+        self.version = 0
+        self.persisted_version: Optional[int] = None   # version last written to the disk cache
+        self.changed = True
+        self.fetches = 0
+        self.probe_hits = 0
+
+    def worksheet(self):
+        return self._open()
+
+    def _probe_token(self, ws):
+        if self._probe is None:
+            return None
         try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            continue
-    try:
-        return datetime.strptime(s, "%d %b %Y").date()
-    except Exception:
-        return None
-
-def build_job_id(title: str, last_date: str) -> str:
-    return f"{(title or '').strip().lower()}|{(last_date or '').strip()}"
-
-def read_sheet_rows() -> List[Tuple[int, Dict[str, str]]]:
-    ws = _open_worksheet()
-    ensure_headers(ws)
-    recs = ws.get_all_records()
-    rows = []
-    for idx, r in enumerate(recs, start=2):
-        rows.append((idx, canonicalize_row(r)))
-    return rows
-
-def remove_expired_rows(rows_with_idx: List[tuple]) -> List[tuple]:
-    ws = _open_worksheet()
-    today = date.today()
-    expired_indices = []
-    for row_idx, row in rows_with_idx:
-        ld = parse_indian_date(row.get("Last Date", ""))
-        if ld is not None and ld < today:
-            expired_indices.append(row_idx)
-
-    if expired_indices:
-        expired_indices.sort(reverse=True)
-        for ri in expired_indices:
+            return self._probe(ws)
+        except Exception as e:
+            log.warning("Sheet change probe failed, doing a full fetch: %s", e)
+            return None
+
+    def refresh(self, force: bool = False) -> List[Tuple[int, Job]]:
+        with self._lock:
+            ws = self._open()
+            # Probe *before* fetching so an edit landing mid-fetch shows up next time.
+            token = self._probe_token(ws)
+            fresh = time.monotonic() - self._fetched_at < self.max_age
+            if (not force and fresh and self._rows is not None
+                    and token is not None and token == self._token):
+                self.probe_hits += 1
+                self.changed = False
+                return self._rows
             try:
-                ws.delete_rows(ri)
-            except Exception as e:
-                log.warning("Failed to delete row %s: %s", ri, e)
-        log.info("Deleted %d expired rows from sheet.", len(expired_indices))
+                values = ws.get_all_values()
+            except Exception:
+                _forget_worksheet()
+                raise
+            self.fetches += 1
+            if ensure_headers(ws, values):
+                # Only row 1 changed; data rows keep their positions.
+                values = [HEADERS] + values[1:]
+            self._rows = _rows_from_values(values)
+            self._token = token
+            self._fetched_at = time.monotonic()
+            self.version += 1
+            self.changed = True
+            return self._rows
+
+    def has_rows(self) -> bool:
+        return self._rows is not None
+
+    def rows(self) -> List[Tuple[int, Job]]:
+        with self._lock:
+            if self._rows is None:
+                return self.refresh(force=True)
+            return self._rows
+
+    def invalidate(self):
+        with self._lock:
+            self._rows = None
+
+SNAPSHOT = SheetSnapshot()
+
+@traced("sheet_read")
+def read_sheet_rows() -> List[Tuple[int, Job]]:
+    """Rows for this cycle: probe for changes, fetch only if the sheet moved.
+    Later steps in the cycle reuse the snapshot."""
+    return SNAPSHOT.refresh()
+
+def collapse_row_ranges(indices: List[int]) -> List[Tuple[int, int]]:
+    """Collapse 1-based row numbers into inclusive (start, end) runs, bottom-most first.
+
+    Bottom-up order matters: inside one batchUpdate the requests apply in
+    sequence, and deleting lower rows first leaves the numbers above intact.
+    """
+    ranges: List[Tuple[int, int]] = []
+    for ri in sorted(set(indices), reverse=True):
+        if ranges and ranges[-1][0] == ri + 1:
+            ranges[-1] = (ri, ranges[-1][1])
+        else:
+            ranges.append((ri, ri))
+    return ranges
+
+def _delete_request(sheet_id, start: int, end: int) -> dict:
+    return {"deleteDimension": {"range": {
+        "sheetId": sheet_id, "dimension": "ROWS",
+        "startIndex": start - 1, "endIndex": end,   # 0-based, end-exclusive
+    }}}
+
+def _rejected(e: Exception) -> bool:
+    """True if Google refused the batchUpdate before applying any of it (bad payload,
+    request too large). A batchUpdate is atomic, so a rejected one changed nothing."""
+    codes = {getattr(e, "code", None), getattr(getattr(e, "response", None), "status_code", None)}
+    return bool(codes & {400, 413})
+
+def delete_row_ranges(ws, indices: List[int]) -> List[Tuple[int, int]]:
+    """Delete rows with as few batchUpdate calls as possible.
 
-    recs = ws.get_all_records()
-    rows = []
-    for idx, r in enumerate(recs, start=2):
-        rows.append((idx, canonicalize_row(r)))
-    return rows
+    All ranges go out in one request when they fit in DELETE_BATCH_SIZE. A
+    batch that Google rejects outright (400 / 413) is split in half and
+    retried, so one bad range or an oversized payload only costs the part
+    that actually failed. Any other failure (timeout, 5xx) may have been
+    applied: deleteDimension is positional and not idempotent, so nothing
+    more is sent and the caller must re-read the sheet before deleting again.
+    Returns the (start, end) ranges that were not (known to be) deleted.
+    """
+    ranges = collapse_row_ranges(indices)
+    failed: List[Tuple[int, int]] = []
+    stopped = False
 
+    def send(batch: List[Tuple[int, int]]):
+        nonlocal stopped
+        if stopped:
+            failed.extend(batch)
+            return
+        try:
+            ws.spreadsheet.batch_update({"requests": [_delete_request(ws.id, a, b) for a, b in batch]})
+        except Exception as e:
+            if not _rejected(e):
+                log.warning("Row delete failed with %s; stopping until the sheet is re-read.", e)
+                stopped = True
+                failed.extend(batch)
+                return
+            if len(batch) == 1:
+                log.warning("Failed to delete rows %s-%s: %s", batch[0][0], batch[0][1], e)
+                failed.append(batch[0])
+                return
+            mid = len(batch) // 2
+            send(batch[:mid])
+            send(batch[mid:])
+
+    for i in range(0, len(ranges), DELETE_BATCH_SIZE):
+        send(ranges[i:i + DELETE_BATCH_SIZE])
+    return failed
+
+@traced("expiry_purge")
+def remove_expired_rows() -> List[Tuple[int, Job]]:
+    """Delete rows whose Last Date has passed; returns the remaining rows.
+
+    Row numbers come from SNAPSHOT while its lock is held, never from the
+    caller: deleteDimension works by position, so two overlapping purges
+    working from the same read would both delete the same numbers and the
+    second would hit the live rows that had shifted into them.
+    """
+    with SNAPSHOT._lock:
+        rows = SNAPSHOT.rows()
+        today = date.today()
+        expired_indices = []
+        for row_idx, job in rows:
+            ld = job.deadline
+            if ld is not None and ld < today:
+                expired_indices.append(row_idx)
+
+        if not expired_indices:
+            return rows
+
+        try:
+            failed = delete_row_ranges(SNAPSHOT.worksheet(), expired_indices)
+        finally:
+            # Row numbers shifted (or may have); refetch before anyone uses them again.
+            SNAPSHOT.invalidate()
+        not_deleted = sum(b - a + 1 for a, b in failed)
+        log.info("Deleted %d expired rows from sheet.", len(expired_indices) - not_deleted)
+        if failed:
+            log.warning("Could not delete expired row ranges: %s", ", ".join(f"{a}-{b}" for a, b in failed))
+        return SNAPSHOT.rows()
+
+def _job_index():
+    """The dedupe index, brought up to date with the sheet as cheaply as possible:
+    from the in-memory snapshot if this process fetched a newer one, from a full
+    read once RECONCILE_SECONDS have passed, otherwise as stored."""
+    index = get_job_index()
+    if index.needs_reconcile():
+        rows = SNAPSHOT.refresh(force=True)
+        index.sync(rows, SNAPSHOT.version, reconciled=True)
+    elif SNAPSHOT.has_rows() and index.synced_version != SNAPSHOT.version:
+        index.sync(SNAPSHOT.rows(), SNAPSHOT.version)
+    return index
+
+@traced("append")
 def append_new_jobs(jobs: List[Dict[str, str]]):
     if not jobs:
         return
 
-    ws = _open_worksheet()
-    ensure_headers(ws)
-
-    existing = ws.get_all_records()
-    existing_ids = set(
-        build_job_id(str(r.get("Job Title","")), str(r.get("Last Date","")))
-        for r in existing
-    )
-
-    rows_to_add = []
-    for j in jobs:
-        title = (j.get("title") or "").strip()
-        last  = (j.get("last_date") or "").strip()
-        jid = build_job_id(title, last)
-        if not title or jid in existing_ids:
+    index = _job_index()
+    rows_to_add, new_keys = [], set()
+    for job in map(Job.from_scraped, jobs):
+        key = job_key(job)
+        if not job.title or key in index or key in new_keys:
             continue
-
-        rows_to_add.append([
-            title,
-            last,
-            (j.get("age") or "").strip(),
-            (j.get("qualification") or "").strip(),
-            (j.get("experience") or "").strip(),
-            (j.get("link") or "").strip(),
-            (j.get("source") or "").strip(),   # ✅ include source
-        ])
+        new_keys.add(key)
+        rows_to_add.append(job.cells())
 
     if rows_to_add:
-        ws.append_rows(rows_to_add, value_input_option="USER_ENTERED")
+        SNAPSHOT.worksheet().append_rows(rows_to_add, value_input_option="USER_ENTERED")
+        SNAPSHOT.invalidate()
+        index.add(new_keys)
         log.info("Appended %d new job rows.", len(rows_to_add))
     else:
         log.info("No new rows to append (after dedupe).")
@@ -0,0 +1,510 @@
+# state_store.py
+# SQLite (WAL) home for the bot's mutable state: subscribers, premium expiry,
+# per-chat message ids and the delivery ledger. Replaces whole-file JSON rewrites
+# with indexed single-row upserts and one transaction per batch of writes.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+from metrics import STORE_WRITE_SECONDS
+
+log = logging.getLogger("state_store")
+
+STATE_DB_FILE = getattr(config, "STATE_DB_FILE", "state.db")
+
+# Legacy JSON files imported once by migrate_from_json().
+SUBSCRIBERS_FILE = config.SUBSCRIBERS_FILE
+SENT_JOBS_FILE = config.SENT_JOBS_FILE
+MESSAGE_IDS_FILE = "message_ids.json"
+PREMIUM_FILE = "premium_users.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id  INTEGER PRIMARY KEY,
+    added_at REAL
+);
+CREATE TABLE IF NOT EXISTS premium (
+    chat_id INTEGER PRIMARY KEY,
+    expiry  TEXT NOT NULL            -- YYYY-MM-DD
+);
+CREATE INDEX IF NOT EXISTS premium_by_expiry ON premium(expiry);
+CREATE TABLE IF NOT EXISTS message_ids (
+    chat_id      INTEGER NOT NULL,
+    source       TEXT NOT NULL,
+    position     INTEGER NOT NULL DEFAULT 0,  -- chunk index when a digest spans several messages
+    message_id   INTEGER NOT NULL,
+    content_hash TEXT,                        -- hash of the text + markup last delivered
+    PRIMARY KEY (chat_id, source, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sent_jobs (    -- legacy global list, read once by the ledger migration
+    job_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+-- Per-chat delivery ledger (see ledger.py). Job ids are 64-bit hashes.
+CREATE TABLE IF NOT EXISTS ledger_baseline (
+    job_hash INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS ledger_synced (
+    chat_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS ledger_partial (
+    chat_id  INTEGER NOT NULL,
+    job_hash INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, job_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ledger_partial_by_job ON ledger_partial(job_hash);
+
+-- Dedupe keys of every job in the sheet (see job_index.py).
+CREATE TABLE IF NOT EXISTS job_index (
+    job_key TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+-- Conditional-GET validators for scraped source pages (see scrapers.py).
+CREATE TABLE IF NOT EXISTS http_cache (
+    url           TEXT PRIMARY KEY,
+    etag          TEXT,
+    last_modified TEXT,
+    content_hash  TEXT NOT NULL,   -- hash of the body last parsed and appended
+    fetched_at    REAL NOT NULL
+) WITHOUT ROWID;
+
+-- Telegram file_id of each uploaded static asset (see media.py).
+CREATE TABLE IF NOT EXISTS media_files (
+    asset_key   TEXT PRIMARY KEY,
+    file_id     TEXT NOT NULL,
+    uploaded_at REAL NOT NULL
+) WITHOUT ROWID;
+
+-- Admin broadcasts (see broadcasts.py). Recipients are fixed when the broadcast
+-- is created; `cursor` is the next position to claim. A recipient is marked
+-- 'sending' right before its send, so after a crash only those become 'unknown'
+-- and are never retried (at most once); claimed recipients that were never
+-- attempted are still 'pending' and are claimed again.
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    text          TEXT NOT NULL,
+    status        TEXT NOT NULL,      -- running | paused | cancelled | done
+    cursor        INTEGER NOT NULL DEFAULT 0,
+    total         INTEGER NOT NULL,
+    admin_chat_id INTEGER,
+    progress_message_id INTEGER,
+    created_at    REAL NOT NULL,
+    finished_at   REAL
+);
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    broadcast_id INTEGER NOT NULL,
+    position     INTEGER NOT NULL,
+    chat_id      INTEGER NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'pending',   -- pending | sending | sent | failed | skipped | unknown
+    PRIMARY KEY (broadcast_id, position)
+) WITHOUT ROWID;
+
+-- Chats whose last sends failed transiently, and when to try them again (see chat_health.py).
+CREATE TABLE IF NOT EXISTS chat_failures (
+    chat_id    INTEGER PRIMARY KEY,
+    failures   INTEGER NOT NULL,
+    retry_at   REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+
+def _load_json(path: str, default):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return default
+    return default
+
+
+class StateStore:
+    def __init__(self, path: str = STATE_DB_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self.writes = 0
+        self.write_seconds = 0.0
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        cols = {r[1] for r in self.conn.execute("PRAGMA table_info(message_ids)")}
+        if "position" not in cols:
+            # Older layout keyed by (chat_id, source): rebuild with a chunk position.
+            content_hash = "content_hash" if "content_hash" in cols else "NULL"
+            self.conn.executescript(f"""
+                BEGIN;
+                CREATE TABLE message_ids_v2 (
+                    chat_id      INTEGER NOT NULL,
+                    source       TEXT NOT NULL,
+                    position     INTEGER NOT NULL DEFAULT 0,
+                    message_id   INTEGER NOT NULL,
+                    content_hash TEXT,
+                    PRIMARY KEY (chat_id, source, position)
+                ) WITHOUT ROWID;
+                INSERT INTO message_ids_v2 (chat_id, source, position, message_id, content_hash)
+                    SELECT chat_id, source, 0, message_id, {content_hash} FROM message_ids;
+                DROP TABLE message_ids;
+                ALTER TABLE message_ids_v2 RENAME TO message_ids;
+                COMMIT;
+            """)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # ---------------- plumbing ----------------
+    @contextmanager
+    def transaction(self):
+        """Group writes into one atomic commit. Nests; only the outermost commits.
+        Keep awaits out of the block so other handlers are not held up."""
+        with self._lock:
+            outer = self._depth == 0
+            started = time.perf_counter()
+            if outer:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if outer:
+                self.conn.execute("COMMIT")
+                self._record_write(started)
+
+    def _record_write(self, started: float):
+        elapsed = time.perf_counter() - started
+        self.writes += 1
+        self.write_seconds += elapsed
+        STORE_WRITE_SECONDS.observe(elapsed)
+
+    def _write(self, sql: str, params=()):
+        with self._lock:
+            started = time.perf_counter()
+            cur = self.conn.execute(sql, params)
+            if self._depth == 0:
+                self._record_write(started)
+            return cur.rowcount
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0][0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._write("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ---------------- subscribers ----------------
+    def subscribers(self) -> List[str]:
+        return [str(r[0]) for r in self._query("SELECT chat_id FROM subscribers ORDER BY added_at, chat_id")]
+
+    def is_subscriber(self, chat_id) -> bool:
+        return bool(self._query("SELECT 1 FROM subscribers WHERE chat_id = ?", (int(chat_id),)))
+
+    def add_subscriber(self, chat_id) -> bool:
+        """Returns True if the chat was not subscribed before."""
+        return self._write("INSERT OR IGNORE INTO subscribers (chat_id, added_at) VALUES (?, ?)",
+                           (int(chat_id), time.time())) > 0
+
+    def remove_subscriber(self, chat_id) -> bool:
+        return self._write("DELETE FROM subscribers WHERE chat_id = ?", (int(chat_id),)) > 0
+
+    def remove_subscribers(self, chat_ids: Iterable[int]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM subscribers WHERE chat_id = ?", ((int(c),) for c in chat_ids))
+
+    # ---------------- premium ----------------
+    def premium_users(self) -> Dict[str, str]:
+        return {str(c): e for c, e in self._query("SELECT chat_id, expiry FROM premium")}
+
+    def premium_expiry(self, chat_id) -> Optional[str]:
+        row = self._query("SELECT expiry FROM premium WHERE chat_id = ?", (int(chat_id),))
+        return row[0][0] if row else None
+
+    def set_premium(self, chat_id, expiry: str):
+        self._write("INSERT OR REPLACE INTO premium (chat_id, expiry) VALUES (?, ?)", (int(chat_id), expiry))
+
+    def remove_premium(self, chat_id) -> bool:
+        return self._write("DELETE FROM premium WHERE chat_id = ?", (int(chat_id),)) > 0
+
+    # ---------------- message ids ----------------
+    def message_ids(self) -> Dict[str, Dict[str, List[Tuple[int, Optional[str]]]]]:
+        """{chat_id: {source: [(message_id, content_hash), ...]}} with chunks in order."""
+        out: Dict[str, Dict[str, List[Tuple[int, Optional[str]]]]] = {}
+        rows = self._query("SELECT chat_id, source, message_id, content_hash FROM message_ids "
+                           "ORDER BY chat_id, source, position")
+        for chat_id, source, mid, h in rows:
+            out.setdefault(str(chat_id), {}).setdefault(source, []).append((mid, h))
+        return out
+
+    def set_message_chunks(self, chat_id, source: str, chunks: List[Tuple[int, Optional[str]]]):
+        """Replace the ordered message ids tracked for one (chat, source)."""
+        self.set_message_chunks_many({(chat_id, source): chunks})
+
+    def set_message_chunks_many(self, updates: Dict[Tuple[object, str], List[Tuple[int, Optional[str]]]]):
+        """set_message_chunks for many (chat, source) pairs in one commit."""
+        with self.transaction():
+            self.conn.executemany("DELETE FROM message_ids WHERE chat_id = ? AND source = ?",
+                                  ((int(c), s) for c, s in updates))
+            self.conn.executemany(
+                "INSERT INTO message_ids (chat_id, source, position, message_id, content_hash) VALUES (?, ?, ?, ?, ?)",
+                ((int(c), s, pos, int(mid), h) for (c, s), chunks in updates.items()
+                 for pos, (mid, h) in enumerate(chunks)),
+            )
+
+    def clear_message_ids(self):
+        self._write("DELETE FROM message_ids")
+
+    def drop_message_ids(self, chat_ids: Iterable[int]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM message_ids WHERE chat_id = ?", ((int(c),) for c in chat_ids))
+
+    # ---------------- sent jobs (legacy) ----------------
+    def sent_jobs(self) -> List[str]:
+        return [r[0] for r in self._query("SELECT job_id FROM sent_jobs")]
+
+    # ---------------- delivery ledger ----------------
+    def ledger_baseline(self) -> Set[int]:
+        return {r[0] for r in self._query("SELECT job_hash FROM ledger_baseline")}
+
+    def ledger_synced(self) -> Set[int]:
+        return {r[0] for r in self._query("SELECT chat_id FROM ledger_synced")}
+
+    def ledger_partial(self) -> Dict[int, Set[int]]:
+        out: Dict[int, Set[int]] = {}
+        for chat_id, h in self._query("SELECT chat_id, job_hash FROM ledger_partial"):
+            out.setdefault(chat_id, set()).add(h)
+        return out
+
+    def ledger_add_baseline(self, hashes: Iterable[int]):
+        with self.transaction():
+            self.conn.executemany("INSERT OR IGNORE INTO ledger_baseline (job_hash) VALUES (?)", ((h,) for h in hashes))
+
+    def ledger_drop_baseline(self, hashes: Iterable[int]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM ledger_baseline WHERE job_hash = ?", ((h,) for h in hashes))
+
+    def ledger_set_synced(self, chat_ids: Iterable[int], synced: bool):
+        sql = ("INSERT OR IGNORE INTO ledger_synced (chat_id) VALUES (?)" if synced
+               else "DELETE FROM ledger_synced WHERE chat_id = ?")
+        with self.transaction():
+            self.conn.executemany(sql, ((int(c),) for c in chat_ids))
+
+    def ledger_add_partial(self, rows: Iterable[tuple]):
+        with self.transaction():
+            self.conn.executemany("INSERT OR IGNORE INTO ledger_partial (chat_id, job_hash) VALUES (?, ?)", rows)
+
+    def ledger_drop_partial(self, rows: Iterable[tuple]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM ledger_partial WHERE chat_id = ? AND job_hash = ?", rows)
+
+    def ledger_drop_partial_chats(self, chat_ids: Iterable[int]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM ledger_partial WHERE chat_id = ?", ((int(c),) for c in chat_ids))
+
+    # ---------------- job index ----------------
+    def job_index_keys(self) -> Set[str]:
+        return {r[0] for r in self._query("SELECT job_key FROM job_index")}
+
+    def job_index_add(self, keys: Iterable[str]):
+        with self.transaction():
+            self.conn.executemany("INSERT OR IGNORE INTO job_index (job_key) VALUES (?)", ((k,) for k in keys))
+
+    def job_index_drop(self, keys: Iterable[str]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM job_index WHERE job_key = ?", ((k,) for k in keys))
+
+    # ---------------- http cache ----------------
+    def http_cache(self) -> Dict[str, Tuple[Optional[str], Optional[str], str]]:
+        """{url: (etag, last_modified, content_hash)}"""
+        return {u: (e, lm, h) for u, e, lm, h in
+                self._query("SELECT url, etag, last_modified, content_hash FROM http_cache")}
+
+    def set_http_cache(self, entries: Dict[str, Tuple[Optional[str], Optional[str], str]]):
+        now = time.time()
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, content_hash, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((u, e, lm, h, now) for u, (e, lm, h) in entries.items()),
+            )
+
+    # ---------------- media ----------------
+    def media_file_id(self, asset_key: str) -> Optional[str]:
+        rows = self._query("SELECT file_id FROM media_files WHERE asset_key = ?", (asset_key,))
+        return rows[0][0] if rows else None
+
+    def set_media_file_id(self, asset_key: str, file_id: str):
+        self._write("INSERT OR REPLACE INTO media_files (asset_key, file_id, uploaded_at) VALUES (?, ?, ?)",
+                    (asset_key, file_id, time.time()))
+
+    def drop_media_file_id(self, asset_key: str):
+        self._write("DELETE FROM media_files WHERE asset_key = ?", (asset_key,))
+
+    # ---------------- broadcasts ----------------
+    BROADCAST_COLUMNS = "id, text, status, cursor, total, admin_chat_id, progress_message_id, created_at, finished_at"
+
+    def create_broadcast(self, text: str, chat_ids: List[int], admin_chat_id: Optional[int] = None) -> int:
+        with self.transaction():
+            cur = self.conn.execute(
+                "INSERT INTO broadcasts (text, status, total, admin_chat_id, created_at) VALUES (?, 'running', ?, ?, ?)",
+                (text, len(chat_ids), admin_chat_id, time.time()),
+            )
+            bid = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO broadcast_recipients (broadcast_id, position, chat_id) VALUES (?, ?, ?)",
+                ((bid, i, int(c)) for i, c in enumerate(chat_ids)),
+            )
+        return bid
+
+    def broadcasts(self, statuses: Optional[Iterable[str]] = None) -> List[tuple]:
+        """Broadcast rows (BROADCAST_COLUMNS order), newest first."""
+        if statuses is None:
+            return self._query(f"SELECT {self.BROADCAST_COLUMNS} FROM broadcasts ORDER BY id DESC")
+        statuses = list(statuses)
+        marks = ",".join("?" * len(statuses))
+        return self._query(f"SELECT {self.BROADCAST_COLUMNS} FROM broadcasts WHERE status IN ({marks}) "
+                           "ORDER BY id DESC", statuses)
+
+    def set_broadcast_status(self, broadcast_id: int, status: str):
+        finished = time.time() if status in ("cancelled", "done") else None
+        self._write("UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ?", (status, finished, broadcast_id))
+
+    def set_broadcast_progress_message(self, broadcast_id: int, message_id: Optional[int]):
+        self._write("UPDATE broadcasts SET progress_message_id = ? WHERE id = ?", (message_id, broadcast_id))
+
+    def claim_broadcast_batch(self, broadcast_id: int, size: int) -> List[Tuple[int, int]]:
+        """Next `size` pending (position, chat_id) recipients; the cursor moves past them in the same commit."""
+        with self.transaction():
+            (cursor,), = self._query("SELECT cursor FROM broadcasts WHERE id = ?", (broadcast_id,))
+            batch = self._query(
+                "SELECT position, chat_id FROM broadcast_recipients "
+                "WHERE broadcast_id = ? AND position >= ? AND status = 'pending' ORDER BY position LIMIT ?",
+                (broadcast_id, cursor, size),
+            )
+            if batch:
+                self.conn.execute("UPDATE broadcasts SET cursor = ? WHERE id = ?", (batch[-1][0] + 1, broadcast_id))
+        return batch
+
+    def mark_broadcast_sending(self, broadcast_id: int, position: int):
+        """Right before the send: from here on a restart must not send to this recipient again."""
+        self._write("UPDATE broadcast_recipients SET status = 'sending' WHERE broadcast_id = ? AND position = ?",
+                    (broadcast_id, position))
+
+    def record_broadcast_results(self, broadcast_id: int, results: Iterable[Tuple[int, str]]):
+        """results: (position, 'sent' | 'failed' | 'skipped')"""
+        with self.transaction():
+            self.conn.executemany(
+                "UPDATE broadcast_recipients SET status = ? WHERE broadcast_id = ? AND position = ?",
+                ((status, broadcast_id, pos) for pos, status in results),
+            )
+
+    def settle_unconfirmed_broadcast(self, broadcast_id: int) -> int:
+        """After an interruption: recipients whose send was in flight become 'unknown'; claimed
+        ones never attempted are released (the cursor moves back to the first pending one).
+        Returns how many became 'unknown'."""
+        with self.transaction():
+            unknown = self.conn.execute(
+                "UPDATE broadcast_recipients SET status = 'unknown' WHERE broadcast_id = ? AND status = 'sending'",
+                (broadcast_id,),
+            ).rowcount
+            self.conn.execute(
+                "UPDATE broadcasts SET cursor = MIN(cursor, COALESCE((SELECT MIN(position) FROM broadcast_recipients "
+                "WHERE broadcast_id = ? AND status = 'pending'), cursor)) WHERE id = ?",
+                (broadcast_id, broadcast_id),
+            )
+        return unknown
+
+    def broadcast_counts(self, broadcast_id: int) -> Dict[str, int]:
+        return dict(self._query(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status",
+            (broadcast_id,),
+        ))
+
+    # ---------------- chat failures ----------------
+    def chat_failures(self) -> Dict[int, Tuple[int, float]]:
+        """{chat_id: (consecutive transient failures, retry_at)}"""
+        return {c: (n, at) for c, n, at in self._query("SELECT chat_id, failures, retry_at FROM chat_failures")}
+
+    def set_chat_failures(self, rows: Iterable[Tuple[int, int, float, Optional[str]]]):
+        """rows: (chat_id, failures, retry_at, last_error)"""
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chat_failures (chat_id, failures, retry_at, last_error) VALUES (?, ?, ?, ?)",
+                ((int(c), n, at, err) for c, n, at, err in rows),
+            )
+
+    def clear_chat_failures(self, chat_ids: Iterable[int]):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM chat_failures WHERE chat_id = ?", ((int(c),) for c in chat_ids))
+
+    # ---------------- migration ----------------
+    def migrate_from_json(self):
+        """One-shot import of the legacy JSON files. The files are left in place."""
+        if self.get_meta("json_migrated"):
+            return
+        subs = _load_json(SUBSCRIBERS_FILE, [])
+        premium = _load_json(PREMIUM_FILE, {})
+        mids = _load_json(MESSAGE_IDS_FILE, {})
+        sent = _load_json(SENT_JOBS_FILE, [])
+        now = time.time()
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO subscribers (chat_id, added_at) VALUES (?, ?)",
+                ((int(c), now + i * 1e-6) for i, c in enumerate(subs)),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO premium (chat_id, expiry) VALUES (?, ?)",
+                ((int(c), e) for c, e in premium.items()),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO message_ids (chat_id, source, message_id) VALUES (?, ?, ?)",
+                ((int(c), s, int(m)) for c, per in mids.items() for s, m in per.items()),
+            )
+            self.conn.executemany("INSERT OR IGNORE INTO sent_jobs (job_id) VALUES (?)", ((j,) for j in sent))
+            self.set_meta("json_migrated", str(now))
+        log.info("Migrated JSON state: %d subscribers, %d premium, %d message ids, %d sent jobs.",
+                 len(subs), len(premium), sum(len(v) for v in mids.values()), len(sent))
+
+
+_STORE: Optional[StateStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> StateStore:
+    """Process-wide store, opened (and migrated from JSON) on first use."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = StateStore(STATE_DB_FILE)
+            _STORE.migrate_from_json()
+        return _STORE
+
+
+def use_store(store: StateStore):
+    """Swap the process-wide store (benchmarks, tools)."""
+    global _STORE
+    with _STORE_LOCK:
+        _STORE = store
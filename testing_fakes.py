@@ -0,0 +1,88 @@
+# testing_fakes.py
+# Offline stand-ins shared by tests/ and benchmarks.py; nothing here talks to Google.
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from jobs import HEADERS
+
+
+class FakeWorksheet:
+    """In-memory stand-in for a gspread Worksheet: just enough for sheet_utils.
+
+    Start from explicit rows (FakeWorksheet(rows)) or synthetic jobs
+    (FakeWorksheet.synthetic(n)); `read_delay` makes reads slow, and `calls`
+    counts the API calls made.
+    """
+
+    id = 0
+
+    def __init__(self, rows=(), read_delay: float = 0.0, sources: int = 8, seed: int = 1):
+        self.values = [list(HEADERS)] + [list(r) for r in rows]
+        self.read_delay = read_delay
+        self.rng = random.Random(seed)
+        self.sources = [f"Source {i}" for i in range(sources)]
+        self.calls = {}
+        self.modified = 0
+        self.spreadsheet = self
+        self._lock = threading.Lock()
+
+    @classmethod
+    def synthetic(cls, n: int, sources: int = 8, seed: int = 1) -> "FakeWorksheet":
+        ws = cls(sources=sources, seed=seed)
+        ws.add_jobs(n)
+        return ws
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def add_jobs(self, n: int):
+        """Append `n` synthetic jobs closing 1 to 365 days from now."""
+        start = datetime.utcnow() + timedelta(days=1)
+        with self._lock:
+            base = len(self.values)
+            for i in range(base, base + n):
+                last = (start + timedelta(days=self.rng.randrange(365))).strftime("%d/%m/%Y")
+                self.values.append([
+                    f"Recruitment of {self.rng.choice(['Junior', 'Senior', 'Assistant'])} Engineer, advt {i}",
+                    last, "18-30 years", "B.Tech / B.E. in relevant discipline", "" if i % 3 else "2 years",
+                    f"https://example.gov.in/advt/{i}.pdf", self.sources[i % len(self.sources)],
+                ])
+            self.modified += 1
+
+    def titles(self):
+        return [r[0] for r in self.values[1:]]
+
+    def get_lastUpdateTime(self):
+        self._call("get_lastUpdateTime")
+        return str(self.modified)
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        # Like the real API: the data is as of the request, the response arrives later.
+        with self._lock:
+            values = [list(r) for r in self.values]
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        return values
+
+    def append_rows(self, rows, **kwargs):
+        self._call("append_rows")
+        with self._lock:
+            self.values.extend(list(r) for r in rows)
+            self.modified += 1
+
+    def batch_update(self, body):
+        self._call("batch_update")
+        with self._lock:
+            for req in body["requests"]:
+                rng = req["deleteDimension"]["range"]
+                del self.values[rng["startIndex"]:rng["endIndex"]]
+            self.modified += 1
+
+    def update(self, values):
+        self._call("update")
+        with self._lock:
+            self.values[0:1] = values
+            self.modified += 1
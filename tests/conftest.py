@@ -0,0 +1,55 @@
+# tests/conftest.py
+# Shared fixtures: a FakeWorksheet (from testing_fakes) and a fresh state store per test.
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from testing_fakes import FakeWorksheet  # noqa: E402
+
+
+def job_row(title: str, days_left: int, source: str = "TEST"):
+    """One sheet row whose Last Date is `days_left` days from today (negative: expired)."""
+    last = (date.today() + timedelta(days=days_left)).strftime("%d/%m/%Y")
+    return [title, last, "", "", "", f"https://example.gov.in/{title}", source]
+
+
+@pytest.fixture
+def sheet(monkeypatch, tmp_path):
+    """Point sheet_utils at a FakeWorksheet (set its rows with sheet.values) and
+    keep the on-disk snapshot in a temp dir."""
+    import sheet_cache
+    import sheet_utils
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sheet_cache, "_MEMO", None)
+    ws = FakeWorksheet([])
+    monkeypatch.setattr(sheet_utils, "SNAPSHOT", sheet_utils.SheetSnapshot(open_worksheet=lambda: ws, probe=None))
+    return ws
+
+
+def _reset_singletons():
+    from chat_health import use_chat_health
+    from ledger import use_ledger
+    from membership import use_membership
+
+    use_membership(None)
+    use_ledger(None)
+    use_chat_health(None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A fresh state store swapped in as the process-wide one (indexes built on it lazily)."""
+    from state_store import StateStore, use_store
+
+    s = StateStore(str(tmp_path / "state.db"))
+    s.set_meta("json_migrated", "test")
+    use_store(s)
+    _reset_singletons()
+    yield s
+    _reset_singletons()
+    s.close()
@@ -0,0 +1,65 @@
+# tests/test_broadcasts.py
+import asyncio
+from collections import Counter
+
+import pytest
+
+import broadcasts
+import delivery
+from broadcasts import BroadcastManager
+from membership import get_membership
+
+
+class FakeBot:
+    """send_message takes `latency`; counts the sends that started and the ones that returned."""
+
+    def __init__(self, latency: float = 0.005):
+        self.latency = latency
+        self.attempts = Counter()
+        self.delivered = Counter()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.attempts[chat_id] += 1
+        await asyncio.sleep(self.latency)
+        self.delivered[chat_id] += 1
+
+
+@pytest.fixture
+def unthrottled(monkeypatch):
+    monkeypatch.setattr(delivery, "LIMITER", delivery.RateLimiter(global_rate=1e9, per_chat_rate=1e9, per_chat_burst=10**6))
+    monkeypatch.setattr(broadcasts, "BATCH_SIZE", 4 * delivery.WORKERS)   # claims more than are in flight
+
+
+def test_restart_mid_batch_resumes_without_double_sends(store, unthrottled):
+    chats = list(range(1000, 1000 + 10 * delivery.WORKERS))
+    members = get_membership()
+    for c in chats:
+        members.add_subscriber(c)
+    fake = FakeBot()
+
+    async def interrupted():
+        manager = BroadcastManager(store)
+        b = await manager.start(fake, "hello", chats)
+        while sum(fake.delivered.values()) < 5 * delivery.WORKERS:   # early in the second batch
+            await asyncio.sleep(0.001)
+        manager.tasks[b.id].cancel()                 # the process is stopping
+        await asyncio.gather(*manager.tasks.values(), return_exceptions=True)
+        return b.id, set(fake.attempts) - set(fake.delivered)   # started, never returned
+
+    bid, in_flight = asyncio.run(interrupted())
+    assert in_flight
+    never_tried = len(chats) - len(fake.attempts)
+    assert never_tried > len(chats) - 2 * broadcasts.BATCH_SIZE   # some were claimed, but not attempted
+
+    async def resumed():
+        manager = BroadcastManager(store)
+        assert manager.resume_all(fake) == 1
+        await asyncio.gather(*manager.tasks.values())
+
+    asyncio.run(resumed())
+
+    assert max(fake.attempts.values()) == 1                         # nobody was sent to twice
+    assert set(fake.delivered) == set(chats) - in_flight            # everyone else got it
+    counts = store.broadcast_counts(bid)
+    assert counts == {"sent": len(chats) - len(in_flight), "unknown": len(in_flight)}
+    assert store.broadcasts()[0][2] == "done"
@@ -0,0 +1,86 @@
+# tests/test_chat_health.py
+import sys
+import threading
+
+from telegram.error import Forbidden, TimedOut
+
+import chat_health
+import metrics
+from chat_health import ChatHealth
+
+
+def test_network_outage_backs_off_nobody(store):
+    health = ChatHealth(store)
+    health.record_ok(1)
+    for chat_id in range(2, 12):
+        health.record_failure(chat_id, TimedOut())
+
+    health.flush()
+
+    assert health.backing_off() == 0
+    assert health.stats.outages == 1
+    assert store.chat_failures() == {}
+
+
+def test_a_few_failing_chats_are_backed_off(store):
+    health = ChatHealth(store)
+    for chat_id in range(1, 11):
+        health.record_ok(chat_id)
+    health.record_failure(11, TimedOut())
+    health.record_failure(12, Forbidden("Forbidden: bot was blocked by the user"))
+
+    health.flush()
+
+    assert health.in_backoff(11) and not health.in_backoff(1)
+    assert set(store.chat_failures()) == {11}
+    assert health.stats.outages == 0
+
+
+def test_success_clears_a_pending_failure(store):
+    health = ChatHealth(store)
+    for chat_id in range(1, 11):
+        health.record_ok(chat_id)
+    health.record_failure(11, TimedOut())
+    health.record_ok(11)
+
+    health.flush()
+
+    assert health.backing_off() == 0
+
+
+def test_reporting_from_another_thread_while_flushing(store, monkeypatch):
+    health = ChatHealth(store)
+    monkeypatch.setattr(chat_health, "_HEALTH", health)
+    errors, done = [], threading.Event()
+
+    def scrape():
+        while not done.is_set():
+            try:
+                health.health()
+                metrics.render()
+            except Exception as e:   # RuntimeError: dictionary changed size during iteration
+                errors.append(e)
+                return
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    reader = threading.Thread(target=scrape)
+    reader.start()
+    try:
+        for rnd in range(100):
+            base = rnd * 100
+            for chat_id in range(base, base + 80):
+                health.record_ok(chat_id)
+            for chat_id in range(base + 80, base + 100):
+                health.record_failure(chat_id, TimedOut())
+            if rnd % 2:
+                for chat_id in range(base - 20, base):   # last round's failures recover
+                    health.record_ok(chat_id)
+            health.flush()
+    finally:
+        done.set()
+        reader.join()
+        sys.setswitchinterval(old_interval)
+
+    assert errors == []
+    assert health.backing_off() == 50 * 20
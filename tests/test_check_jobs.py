@@ -0,0 +1,32 @@
+# tests/test_check_jobs.py
+import asyncio
+
+import pytest
+
+import delivery
+from conftest import job_row
+from membership import get_membership
+from test_resendall import FakeBot
+
+
+@pytest.fixture
+def unthrottled(monkeypatch):
+    monkeypatch.setattr(delivery, "LIMITER", delivery.RateLimiter(global_rate=1e9, per_chat_rate=1e9, per_chat_burst=10**6))
+
+
+def test_message_ids_and_ledger_land_in_one_commit(sheet, store, unthrottled):
+    import bot
+
+    sheet.values[1:] = [job_row(f"job-{i}", 5 + i, source=f"S{i % 3}") for i in range(9)]
+    chats = list(range(500, 540))
+    for c in chats:
+        get_membership().add_subscriber(c)
+    fake = FakeBot()
+
+    writes = store.writes
+    assert asyncio.run(bot.check_jobs(fake))
+
+    assert store.writes - writes <= 3          # not one commit per (chat, source)
+    tracked = store.message_ids()
+    assert set(tracked) == {str(c) for c in chats}
+    assert all(set(per_chat) == {"S0", "S1", "S2"} for per_chat in tracked.values())
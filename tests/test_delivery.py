@@ -0,0 +1,37 @@
+# tests/test_delivery.py
+import asyncio
+
+from delivery import DeliveryRun, RateLimiter
+
+
+async def send_message(chat_id, text):
+    return text
+
+
+def test_finished_run_leaves_no_idle_lanes(store):
+    limiter = RateLimiter(global_rate=1e9, per_chat_rate=1e6, per_chat_burst=3)
+
+    async def fan_out():
+        async with DeliveryRun("test", limiter=limiter) as run:
+            for chat_id in range(500):
+                run.submit(chat_id, lambda c=chat_id: run.call(send_message, chat_id=c, text="hi"))
+
+    for _ in range(3):
+        asyncio.run(fan_out())
+        assert limiter.lanes == {} and limiter.paused_until == {}
+
+
+def test_sweep_keeps_lanes_that_still_limit():
+    limiter = RateLimiter(global_rate=1e9, per_chat_rate=0.001, per_chat_burst=1)
+
+    async def use(chat_id):
+        await limiter.acquire(chat_id)
+
+    asyncio.run(use(1))           # bucket empty for the next ~1000s
+    limiter.pause(2, 60)          # flood wait still running
+    limiter.pause(3, -1)          # flood wait already over
+    limiter._lane(4)
+
+    assert limiter.sweep() == 1   # only chat 4's untouched, full bucket
+    assert set(limiter.lanes) == {1}
+    assert set(limiter.paused_until) == {2}
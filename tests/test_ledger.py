@@ -0,0 +1,63 @@
+# tests/test_ledger.py
+from ledger import DeliveryLedger, job_hash
+
+A, B = 101, 202
+H1, H2, H3 = (job_hash(f"job-{i}") for i in (1, 2, 3))
+
+
+def run(ledger, active, delivered=(), failed=()):
+    """What check_jobs does around the sends: delta, per-chat pending, commit."""
+    ledger.collect_garbage(active)
+    delta = ledger.delta(active)
+    pending = {c: ledger.pending(c, active, delta) for c in (A, B)}
+    ledger.commit_run(active, delivered, failed)
+    return pending
+
+
+def test_job_sent_to_one_chat_is_still_pending_for_another(store):
+    ledger = DeliveryLedger(store)
+
+    first = run(ledger, {H1}, delivered=[A], failed=[B])
+    assert first == {A: {H1}, B: {H1}}
+
+    second = run(ledger, {H1, H2}, delivered=[A, B])
+    assert second == {A: {H2}, B: {H1, H2}}
+    assert ledger.all_synced({A, B})
+
+
+def test_partial_failure_is_retried_only_for_the_failed_chat(store):
+    ledger = DeliveryLedger(store)
+    run(ledger, {H1}, delivered=[A, B])
+
+    assert run(ledger, {H1, H2}, delivered=[A], failed=[B]) == {A: {H2}, B: {H2}}
+
+    # Next run, nothing new: A is up to date, B only gets what it missed. Also after a restart.
+    for current in (ledger, DeliveryLedger(store)):
+        delta = current.delta({H1, H2})
+        assert current.pending(A, {H1, H2}, delta) == set()
+        assert current.pending(B, {H1, H2}, delta) == {H2}
+
+
+def test_mark_delivered_catches_a_chat_up(store):
+    ledger = DeliveryLedger(store)
+    run(ledger, {H1, H2}, delivered=[A], failed=[B])
+
+    ledger.mark_delivered(B, {H1, H2})          # /resendall
+    assert ledger.pending(B, {H1, H2}, ledger.delta({H1, H2})) == set()
+
+    ledger.mark_delivered(A, {H1, H2, H3})      # ahead of the baseline: tracked explicitly
+    assert A not in ledger.synced
+    assert ledger.pending(A, {H1, H2, H3}, ledger.delta({H1, H2, H3})) == set()
+
+
+def test_expired_hashes_are_collected(store):
+    ledger = DeliveryLedger(store)
+    run(ledger, {H1}, delivered=[A, B])
+    run(ledger, {H1, H2}, delivered=[A], failed=[B])   # B now holds {H1} explicitly
+
+    assert ledger.collect_garbage({H2}) == 1
+    assert ledger.baseline == {H2}
+    assert ledger.partial[B] == set()
+    reloaded = DeliveryLedger(store)
+    assert reloaded.baseline == {H2} and reloaded.partial.get(B, set()) == set()
+    assert reloaded.pending(B, {H2}, reloaded.delta({H2})) == {H2}
@@ -0,0 +1,48 @@
+# tests/test_media.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+from media import MediaCache
+
+
+class FakeBot:
+    def __init__(self, file_id_error=None):
+        self.file_id_error = file_id_error
+        self.uploads = 0
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if isinstance(photo, str):
+            if self.file_id_error:
+                raise self.file_id_error
+            return SimpleNamespace(photo=[SimpleNamespace(file_id=photo)])
+        self.uploads += 1
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"new-{self.uploads}")])
+
+
+def send(cache, bot):
+    return asyncio.run(cache.send(bot, "photo", 42, "qr", lambda: b"png", "qr.png"))
+
+
+def test_stale_file_id_is_dropped_and_reuploaded(store, tmp_path):
+    cache = MediaCache(store, directory=str(tmp_path))
+    store.set_media_file_id("qr", "old")
+
+    send(cache, FakeBot(BadRequest("Wrong file identifier/http url specified")))
+
+    assert cache.stats.stale_file_ids == 1
+    assert store.media_file_id("qr") == "new-1"
+
+
+def test_other_bad_requests_keep_the_file_id(store, tmp_path):
+    cache = MediaCache(store, directory=str(tmp_path))
+    store.set_media_file_id("qr", "old")
+    bot = FakeBot(BadRequest("Message caption is too long"))
+
+    with pytest.raises(BadRequest):
+        send(cache, bot)
+
+    assert bot.uploads == 0
+    assert store.media_file_id("qr") == "old"
@@ -0,0 +1,50 @@
+# tests/test_resendall.py
+import asyncio
+from itertools import count
+from types import SimpleNamespace
+
+from conftest import job_row
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent, self.edited, self.deleted = [], [], []
+        self._ids = count(100)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        mid = next(self._ids)
+        self.sent.append(mid)
+        return SimpleNamespace(message_id=mid)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.edited.append(message_id)
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append(message_id)
+
+
+def test_repeated_resendall_sends_the_digest_again(sheet, store):
+    import bot
+
+    sheet.values[1:] = [job_row("live-1", 5), job_row("live-2", 9)]
+    fake = FakeBot()
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=42), message=SimpleNamespace(reply_text=reply_text))
+    context = SimpleNamespace(bot=fake)
+
+    def digest_ids():
+        return {mid for chunks in store.message_ids()["42"].values() for mid, _ in chunks}
+
+    asyncio.run(bot.cmd_resendall(update, context))
+    first_sent, first_digest = list(fake.sent), digest_ids()
+    asyncio.run(bot.cmd_resendall(update, context))
+
+    assert first_digest and len(fake.sent) == 2 * len(first_sent)   # digest and teaser, both times
+    assert fake.edited == []
+    assert digest_ids() <= set(fake.sent[len(first_sent):])
+    assert set(fake.deleted) == first_digest                         # the old copies are gone
+    assert replies == []
@@ -0,0 +1,73 @@
+# tests/test_scrapers.py
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import metrics
+import scrapers
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+RSS = """<rss><channel>
+<item><title>Recruitment of Junior Engineers 2025</title><link>/a</link>
+<description>Apply by 20/10/2099</description></item>
+<item><title>Notification for Apprentice posts</title><link>/b</link>
+<description>Dates to be announced</description></item>
+</channel></rss>"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(scrapers, "KEYWORDS", [])
+    monkeypatch.setattr(scrapers, "STATS", {})
+
+
+def scrape(body: str, url: str, method: str):
+    """scrape_source against `body` served locally at `url`."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await scrapers.Scraper(client=client).scrape_source("TEST", {"url": url, "method": method})
+
+    return asyncio.run(run())
+
+
+def test_items_without_a_last_date_are_skipped():
+    jobs = scrape(RSS, "https://example.gov.in/rss", "rss")
+
+    assert [j["title"] for j in jobs] == ["Recruitment of Junior Engineers 2025"]
+    assert jobs[0]["last_date"] == "20/10/2099"
+    assert scrapers.STATS["TEST"].undated == 1
+    assert "1 undated" in scrapers.stats_summary()
+
+
+def test_saved_careers_page():
+    with open(os.path.join(DATA, "careers.html"), encoding="utf-8") as f:
+        page = f.read()
+
+    jobs = scrape(page, "https://www.example.gov.in/careers.html", "scraper")
+
+    assert [(j["title"], j["last_date"], j["link"]) for j in jobs] == [
+        ("Recruitment of Scientist/Engineer 'SC' - Advt. No. 12/2099", "31/03/2099",
+         "https://www.example.gov.in/docs/advt-12-2099.pdf"),
+        ("Engagement of Graduate Apprentices under the Apprentices Act", "15/04/2099",
+         "https://www.example.gov.in/docs/apprentice.pdf"),
+    ]
+    assert all(j["source"] == "TEST" for j in jobs)
+    stats = scrapers.STATS["TEST"]
+    assert stats.undated == 2      # the JRF walk-in and "Results of previous recruitment"
+    assert stats.expired == 1      # Advt. No. 03/2020 closed long ago
+    assert "1 closed" in scrapers.stats_summary()
+    assert scrapers.SCRAPE_SKIPPED.value(source="TEST", reason="closed") >= 1
+    exposition = metrics.render()
+    assert 'jobbot_scrape_pages_total{result="changed",source="TEST"}' in exposition
+    assert 'jobbot_scrape_items_skipped_total{reason="undated",source="TEST"}' in exposition
+
+
+def test_extract_last_date_takes_the_latest_date():
+    assert scrapers.extract_last_date("Opens 01/03/2099, closes 31.03.2099") == "31/03/2099"
+    assert scrapers.extract_last_date("Apply from 1st March 2099 to 15th April 2099") == "15/04/2099"
+    assert scrapers.extract_last_date("Advt. No. 12/2099") == ""
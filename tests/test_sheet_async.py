@@ -0,0 +1,97 @@
+# tests/test_sheet_async.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+import sheet_async
+import sheet_utils
+from conftest import job_row
+from jobs import Job
+
+
+def test_overlapping_refreshes_only_delete_expired_rows(sheet):
+    sheet.values[1:] = [
+        job_row("live-1", 5), job_row("old-1", -3), job_row("live-2", 10),
+        job_row("live-3", 1), job_row("old-2", -1), job_row("live-4", 30),
+    ]
+    sheet.read_delay = 0.05   # long enough for the two refreshes to overlap
+
+    async def both():
+        return await asyncio.gather(sheet_async.fetch_active_rows(), sheet_async.fetch_active_rows())
+
+    first, second = asyncio.run(both())
+
+    assert sheet.titles() == ["live-1", "live-2", "live-3", "live-4"]
+    assert [j.title for _, j in first] == [j.title for _, j in second] == sheet.titles()
+
+
+def test_commands_stay_responsive_during_a_slow_sheet_read(sheet, store):
+    import bot
+
+    sheet.values[1:] = [job_row("live-1", 5)]
+    sheet.read_delay = 0.5
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=42), message=SimpleNamespace(reply_text=reply_text))
+
+    async def scenario():
+        refresh = asyncio.create_task(sheet_async.fetch_active_rows())
+        await asyncio.sleep(0.05)   # the read is now blocking a sheet I/O thread
+        started = time.perf_counter()
+        await bot.cmd_premiumstatus(update, None)
+        latency = time.perf_counter() - started
+        still_reading = not refresh.done()
+        await refresh
+        return latency, still_reading
+
+    latency, still_reading = asyncio.run(scenario())
+
+    assert still_reading
+    assert latency < 0.1
+    assert replies and "not subscribed" in replies[0]
+
+
+def test_disk_snapshot_is_only_rewritten_when_rows_change(sheet, monkeypatch):
+    import sheet_cache
+
+    sheet.values[1:] = [job_row("live-1", 5), job_row("old-1", -2)]
+    saves = []
+    real_save = sheet_cache.save
+    monkeypatch.setattr(sheet_cache, "save", lambda rows: (saves.append(len(rows)), real_save(rows)))
+    token = ["a"]
+    sheet_utils.SNAPSHOT._probe = lambda ws: token[0]
+
+    for _ in range(3):
+        asyncio.run(sheet_async.fetch_active_rows())
+    assert saves == [1]          # first fetch (purged, refetched) saved; unchanged ticks did not
+
+    sheet.values.append(job_row("live-2", 9))
+    token[0] = "b"
+    asyncio.run(sheet_async.fetch_active_rows())
+    assert saves == [1, 2]
+
+
+def test_cached_reads_do_not_queue_behind_a_slow_fetch(sheet, monkeypatch):
+    import sheet_cache
+
+    sheet.values[1:] = [job_row("live-1", 5)]
+    stale = time.time() - sheet_cache.FRESH_SECONDS - 60
+    monkeypatch.setattr(sheet_cache, "_MEMO", sheet_cache.CachedSnapshot(stale, [(2, Job.from_cells(job_row("old", 5)))]))
+    sheet.read_delay = 0.5
+
+    async def scenario():
+        check = asyncio.create_task(sheet_async.fetch_active_rows())   # the scheduled check, mid-read
+        await asyncio.sleep(0.05)
+        latencies = []
+        for _ in range(3):
+            started = time.perf_counter()
+            rows = await sheet_async.active_rows(prefer_cache=True)
+            latencies.append(time.perf_counter() - started)
+            assert [j.title for _, j in rows] == ["old"]
+        await check
+        return latencies
+
+    assert max(asyncio.run(scenario())) < 0.1
@@ -0,0 +1,51 @@
+# tests/test_sheet_utils.py
+import sheet_utils
+from conftest import job_row
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def test_rejected_batch_is_split_and_retried(sheet):
+    sheet.values[1:] = [job_row(f"row-{i}", 5) for i in range(8)]
+    real = sheet.batch_update
+
+    def batch_update(body):
+        if len(body["requests"]) > 1:
+            raise APIError(400)   # refused: nothing applied
+        real(body)
+
+    sheet.batch_update = batch_update
+    failed = sheet_utils.delete_row_ranges(sheet, [2, 4, 6])
+
+    assert failed == []
+    assert sheet.titles() == ["row-1", "row-3", "row-5", "row-6", "row-7"]
+
+
+def test_ambiguous_failure_is_not_retried(sheet):
+    sheet.values[1:] = [job_row(f"row-{i}", 5) for i in range(8)]
+    real = sheet.batch_update
+    calls = []
+
+    def batch_update(body):
+        calls.append(len(body["requests"]))
+        real(body)            # Google applied it...
+        raise APIError(503)   # ...but the response never made it back
+
+    sheet.batch_update = batch_update
+    failed = sheet_utils.delete_row_ranges(sheet, [2, 4, 6])
+
+    assert calls == [3]
+    assert failed == [(6, 6), (4, 4), (2, 2)]
+    assert sheet.titles() == ["row-1", "row-3", "row-5", "row-6", "row-7"]   # no live row lost
+
+
+def test_probe_without_get_last_update_time_forces_a_fetch():
+    class OldSpreadsheet:
+        lastUpdateTime = "2024-01-01T00:00:00Z"   # set once at open, never refreshed
+
+    ws = type("WS", (), {"spreadsheet": OldSpreadsheet()})()
+    assert sheet_utils.probe_modified_time(ws) is None
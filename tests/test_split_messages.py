@@ -0,0 +1,46 @@
+# tests/test_split_messages.py
+from jobs import Job
+
+import bot
+
+
+def jobs(n: int, prefix: str = "Recruitment of Engineer post"):
+    return [Job.from_cells([f"{prefix} {i}", f"{1 + i % 28:02d}/11/2026", "18-30 years", "B.Tech / B.E.",
+                            "" if i % 3 else "2 years", f"https://example.gov.in/advt/{i}.pdf", "SSC"])
+            for i in range(n)]
+
+
+def changed_span(old, new):
+    """(chunks of `new` that differ, chunks of `old` they replace) once the common prefix and suffix are cut off."""
+    p = 0
+    while p < min(len(old), len(new)) and old[p] == new[p]:
+        p += 1
+    s = 0
+    while s < min(len(old), len(new)) - p and old[-1 - s] == new[-1 - s]:
+        s += 1
+    return len(new) - p - s, len(old) - p - s
+
+
+def test_insert_only_changes_the_chunk_it_lands_in():
+    base = jobs(120)
+    extra = jobs(1, prefix="Walk-in interview for Project Fellow")[0]
+    old = bot.split_messages("SSC", base)
+    assert len(old) > 5 and all(len(m) <= bot.MAX_LEN for m in old)
+
+    spans = [changed_span(old, bot.split_messages("SSC", base[:i] + [extra] + base[i:])) for i in range(len(base) + 1)]
+
+    # The chunks before and after the one that got the new job are byte-identical. (This
+    # job ends a chunk by its hash, so the chunk it lands in may come back as two.)
+    assert max(gone for _, gone in spans) <= 1
+    assert max(new for new, _ in spans) <= 2
+
+
+def test_removal_only_changes_the_chunk_it_leaves():
+    base = jobs(120)
+    old = bot.split_messages("SSC", base)
+
+    spans = [changed_span(old, bot.split_messages("SSC", base[:i] + base[i + 1:])) for i in range(len(base))]
+
+    # At most the chunk it leaves, merged with the next one if the job ended its chunk.
+    assert max(gone for _, gone in spans) <= 2
+    assert max(new for new, _ in spans) <= 2
@@ -0,0 +1,123 @@
+# tests/test_webhook.py
+# The webhook server end to end: Telegram-style POSTs go into a real Application
+# built by bot.build_application, whose Bot talks to a fake Bot API on localhost.
+import asyncio
+import json
+from itertools import count
+
+import pytest
+import tornado.httpserver
+import tornado.testing
+import tornado.web
+
+import bot
+
+SECRET = "s3cret"
+TOKEN = "123:TEST"
+
+
+def update(update_id: int, text: str, chat_id: int = 42) -> dict:
+    return {"update_id": update_id,
+            "message": {"message_id": update_id, "date": 0, "text": text,
+                        "chat": {"id": chat_id, "type": "private"},
+                        "from": {"id": chat_id, "is_bot": False, "first_name": "A"},
+                        "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}}
+
+
+class FakeBotAPI(tornado.web.RequestHandler):
+    """POST /bot<token>/<method>: answers getMe and sendMessage, records every call."""
+
+    def initialize(self, calls):
+        self.calls = calls
+
+    def post(self, token, method):
+        if self.request.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(self.request.body or b"{}")
+        else:
+            params = {k: self.get_body_argument(k) for k in self.request.body_arguments}
+        self.calls.append((method, params))
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        elif method == "sendMessage":
+            result = {"message_id": next(self.application.settings["ids"]), "date": 0, "text": params.get("text", ""),
+                      "chat": {"id": int(params["chat_id"]), "type": "private"}}
+        else:
+            result = True
+        self.write({"ok": True, "result": result})
+
+
+@pytest.mark.usefixtures("store")
+class WebhookTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        self.api_calls = []
+        sock, port = tornado.testing.bind_unused_port()
+        api = tornado.web.Application([(r"/bot([^/]+)/(\w+)", FakeBotAPI, {"calls": self.api_calls})], ids=count(1000))
+        self.api_server = tornado.httpserver.HTTPServer(api)
+        self.api_server.add_sockets([sock])
+        self.application = bot.build_application(token=TOKEN, base_url=f"http://127.0.0.1:{port}/bot")
+        return bot.make_webhook_app(self.application, secret=SECRET, path="/telegram")
+
+    def setUp(self):
+        super().setUp()
+        self.io_loop.run_sync(self.application.initialize)
+        self.io_loop.run_sync(self.application.start)
+
+    def tearDown(self):
+        self.io_loop.run_sync(self.application.stop)
+        self.io_loop.run_sync(self.application.shutdown)
+        self.api_server.stop()
+        super().tearDown()
+
+    def post_update(self, secret, body):
+        headers = {"Content-Type": "application/json"}
+        if secret is not None:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+        return self.fetch("/telegram", method="POST", body=body, headers=headers)
+
+    def sent_messages(self):
+        return [params for method, params in self.api_calls if method == "sendMessage"]
+
+    def wait_for(self, predicate, timeout: float = 5.0):
+        async def poll():
+            while not predicate():
+                await asyncio.sleep(0.01)
+        self.io_loop.run_sync(poll, timeout=timeout)
+
+    def test_start_command_reaches_the_handler_and_the_bot_api(self):
+        resp = self.post_update(SECRET, json.dumps(update(1, "/start")))
+        assert resp.code == 200
+
+        self.wait_for(lambda: len(self.sent_messages()) >= 2)   # the reply and the premium teaser
+        reply = self.sent_messages()[0]
+        assert reply["chat_id"] == "42" and "Subscribed" in reply["text"]
+        from membership import get_membership
+        assert get_membership().is_subscriber(42)
+
+    def test_bad_or_missing_secret_is_refused(self):
+        assert self.post_update("wrong", json.dumps(update(2, "/start"))).code == 403
+        assert self.post_update(None, json.dumps(update(3, "/start"))).code == 403
+        assert self.application.update_queue.empty()
+        assert self.sent_messages() == []
+
+    def test_unparseable_payload_is_rejected(self):
+        assert self.post_update(SECRET, "{not json").code == 400
+        assert self.application.update_queue.empty()
+
+    def test_ping(self):
+        resp = self.fetch("/ping")
+        assert resp.code == 200
+        assert "alive" in resp.body.decode("utf-8")
+
+    def test_metrics(self):
+        resp = self.fetch("/metrics")
+        assert resp.code == 200
+        assert resp.headers["Content-Type"].startswith("text/plain")
+        assert b"jobbot_" in resp.body
+
+    def test_health(self):
+        resp = self.fetch("/health")
+        assert resp.code == 200
+        body = json.loads(resp.body)
+        assert {"check_jobs", "chat_health"} <= set(body)
+        assert body["chat_health"]["pruned_total"] == 0
+